@@ -0,0 +1,187 @@
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, HEURISTICS
+from MiniChessPerft import REFERENCE_POSITIONS
+from MiniChessTraces import parse_text_trace, read_trace
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_DIRS = sorted(glob.glob(os.path.join(SOURCE_DIR, "472_Project_*", "traces")))
+BASELINE_FILE = os.path.join(SOURCE_DIR, "benchBaseline.json")
+
+
+def trace_positions(directories):
+    """
+    Yields every position (as parse_position text) of the gameTrace files in
+    directories: the initial board and the board after each move, with the
+    other side to move. Text and .jsonl traces are both read.
+    """
+    game = MiniChess()
+    for directory in directories:
+        for file_name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, file_name)
+            if file_name.endswith(".jsonl"):
+                records = ((record["type"], record) for record in read_trace(path))
+            elif file_name.endswith(".txt"):
+                with open(path) as f:
+                    records = list(parse_text_trace(f))
+            else:
+                continue
+            for record_type, record in records:
+                if "board" not in record:
+                    continue
+                if record_type == "game":
+                    turn = "white"
+                elif record_type == "move":
+                    turn = "black" if record["player"].lower() == "white" else "white"
+                else:
+                    continue
+                yield game.format_position({"board": record["board"], "turn": turn})
+
+
+def bench_positions(directories=TRACE_DIRS):
+    """
+    The bench set: the positions of the stored game traces, then the perft
+    reference positions (promotions and king captures), once each and only
+    while both kings are on the board.
+    """
+    game = MiniChess()
+    positions = []
+    for text in list(trace_positions(directories)) + [text for text, _ in REFERENCE_POSITIONS.values()]:
+        bitboards = game.get_bitboards(game.parse_position(text))
+        if bitboards['wK'] and bitboards['bK'] and text not in positions:
+            positions.append(text)
+    return positions
+
+
+def run_bench(positions, depth, heuristics, algorithm='a'):
+    """
+    Searches every position to depth with each heuristic through use_minimax,
+    from a fresh game each time, without the opening book, endgame tables or
+    helper processes, so the node counts only depend on the search itself.
+    Returns the results dict that is compared with (and stored as) the baseline.
+    """
+    engine_module.TIME_LIMIT = math.inf
+    engine_module.MAX_SEARCH_DEPTH = depth
+    engine_module.algorithm = algorithm
+    engine_module.SEARCH_WORKERS = 1
+    engine_module.USE_OPENING_BOOK = False
+    engine_module.USE_TABLEBASE = False
+    game = MiniChess()
+    game.verbose = False
+
+    nodes = []
+    moves = []
+    search_time = 0.0
+    for heuristic in heuristics:
+        engine_module.chosen_heuristic = heuristic
+        for text in positions:
+            game.new_game()
+            game_state = game.parse_position(text)
+            game.ai_color = game_state["turn"]
+            start_time = time.perf_counter()
+            _, move = game.use_minimax(game_state, alpha=-math.inf, beta=math.inf, maximizing_player=True,
+                                       start_time=time.time())
+            search_time += time.perf_counter() - start_time
+            nodes.append(game.search_stats.totals["nodes"])
+            moves.append(game.format_move(move) if move is not None else None)
+
+    total = sum(nodes)
+    return {
+        "depth": depth,
+        "algorithm": algorithm,
+        "heuristics": list(heuristics),
+        "quiescence_depth": engine_module.QUIESCENCE_DEPTH,
+        "positions": positions,
+        "nodes": nodes,
+        "moves": moves,
+        "signature": total,
+        "seconds": search_time,
+        "nps": total / search_time if search_time > 0 else 0.0,
+        "python": platform.python_version(),
+    }
+
+
+def compare(result, baseline, tolerance):
+    """
+    Returns (lines describing the differences, True if the bench passes).
+    The node counts must match the baseline exactly; the speed may be at most
+    tolerance percent below it.
+    """
+    lines = []
+    for key in ("depth", "algorithm", "heuristics", "quiescence_depth", "positions"):
+        if result[key] != baseline.get(key):
+            return [f"The baseline was made with a different {key}; run with --update to replace it."], False
+
+    passed = True
+    if result["signature"] == baseline["signature"] and result["nodes"] == baseline["nodes"]:
+        lines.append(f"Node signature {result['signature']} matches the baseline.")
+    else:
+        passed = False
+        lines.append(f"Node signature {result['signature']} differs from the baseline's {baseline['signature']}:")
+        count = len(result["positions"])
+        for index, (nodes, expected) in enumerate(zip(result["nodes"], baseline["nodes"])):
+            if nodes != expected:
+                heuristic = result["heuristics"][index // count]
+                lines.append(f"  {heuristic} {result['positions'][index % count]}: {nodes} nodes "
+                             f"(was {expected}), move {result['moves'][index]} (was {baseline['moves'][index]})")
+
+    change = 100.0 * (result["nps"] / baseline["nps"] - 1.0) if baseline["nps"] else 0.0
+    lines.append(f"Speed {result['nps']:.0f} nps against {baseline['nps']:.0f} in the baseline ({change:+.1f}%).")
+    if change < -tolerance:
+        passed = False
+        lines.append(f"That is more than {tolerance:g}% slower.")
+    return lines, passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a fixed set of positions to a fixed depth and compare "
+                                                 "node counts and speed with a stored baseline.")
+    parser.add_argument("--depth", type=int, default=4, help="search depth in plies")
+    parser.add_argument("--heuristics", nargs="+", choices=HEURISTICS, default=HEURISTICS, help="heuristics to search with")
+    parser.add_argument("--algorithm", choices=['m', 'a'], default='a', help="m = minimax, a = alpha-beta")
+    parser.add_argument("--traces", nargs="+", default=TRACE_DIRS, help="directories with the gameTrace files to take positions from")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON to compare with")
+    parser.add_argument("--update", action="store_true", help="write this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="percent slower than the baseline that still passes")
+    parser.add_argument("--repeat", type=int, default=1, help="run the bench this many times and keep the fastest")
+    args = parser.parse_args(argv)
+
+    positions = bench_positions(args.traces)
+    result = None
+    for _ in range(args.repeat):
+        run = run_bench(positions, args.depth, args.heuristics, args.algorithm)
+        if result is None or run["seconds"] < result["seconds"]:
+            result = run
+
+    print(f"{len(positions)} positions x {len(args.heuristics)} heuristics at depth {args.depth}")
+    print(f"Nodes:     {result['signature']}")
+    print(f"Time:      {result['seconds']:.2f} sec")
+    print(f"Nodes/sec: {result['nps']:.0f}")
+
+    if args.update:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=1)
+            f.write("\n")
+        print(f"Wrote the baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update to create it.")
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    lines, passed = compare(result, baseline, args.tolerance)
+    print("\n".join(lines))
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, OpeningBook, HEURISTICS, ZOBRIST_HEURISTICS
+
+CHECKPOINT_SEARCHES = 200  # searches between book writes during a build
+
+# Each pool process keeps one MiniChess, so its transposition table carries over between positions
+worker_game = None
+
+
+def opening_positions(game, plies):
+    """
+    Returns the positions (as parse_position text) reached from the start
+    position in fewer than plies moves, once each. Positions where a king
+    has been captured are left out.
+    """
+    game_state = game.init_board()
+    seen = set()
+    positions = []
+
+    def visit(remaining):
+        bitboards = game.get_bitboards(game_state)
+        if not bitboards['wK'] or not bitboards['bK']:
+            return
+        key = game.get_hash(game_state)
+        if key in seen:
+            return
+        seen.add(key)
+        positions.append(game.format_position(game_state))
+        if remaining == 1:
+            return
+        for move in game.valid_moves(game_state):
+            game.apply_move(game_state, move)
+            visit(remaining - 1)
+            game.undo_move(game_state)
+
+    visit(plies)
+    return positions
+
+
+def init_worker():
+    global worker_game
+    engine_module.USE_OPENING_BOOK = False
+    engine_module.TIME_LIMIT = math.inf
+    engine_module.algorithm = 'a'
+    worker_game = MiniChess()
+    worker_game.verbose = False
+    # Scores are kept from white's side for every position, so the table stays consistent
+    worker_game.ai_color = "white"
+
+
+def search_position(job):
+    """Searches one position to a fixed depth; returns (book key, score for the side to move, move, depth)."""
+    position, heuristic, depth = job
+    game = worker_game
+    engine_module.chosen_heuristic = heuristic
+    engine_module.MAX_SEARCH_DEPTH = depth
+    game_state = game.parse_position(position)
+    white_to_move = game_state["turn"] == "white"
+
+    score, move = game.iterative_deepening(game_state, -math.inf, math.inf, white_to_move, time.time())
+    key = game.get_hash(game_state) ^ ZOBRIST_HEURISTICS[heuristic]
+    return key, (score if white_to_move else -score), move, game.completed_depth
+
+
+def build_book(plies, depth, heuristics, workers, entries=None, output=None, checkpoint=CHECKPOINT_SEARCHES,
+               progress=True):
+    """
+    Searches every opening position up to plies moves deep with each heuristic,
+    on a process pool, and returns the book entries (key -> (score, move, depth)).
+    Entries already in entries at least as deep are not searched again. With
+    an output file, the entries so far are written to it every checkpoint
+    searches, so an interrupted build keeps most of its work.
+    """
+    entries = dict(entries or {})
+    game = MiniChess()
+    positions = opening_positions(game, plies)
+    jobs = []
+    for heuristic in heuristics:
+        for position in positions:
+            key = game.get_hash(game.parse_position(position)) ^ ZOBRIST_HEURISTICS[heuristic]
+            if key not in entries or entries[key][2] < depth:
+                jobs.append((position, heuristic, depth))
+    if progress:
+        print(f"{len(positions)} positions, {len(jobs)} searches to depth {depth} on {workers} workers")
+
+    with multiprocessing.Pool(processes=workers, initializer=init_worker) as pool:
+        for done, (key, score, move, searched_depth) in enumerate(pool.imap_unordered(search_position, jobs, chunksize=4), start=1):
+            if move is not None:
+                entries[key] = (score, move, searched_depth)
+            if progress and done % 100 == 0:
+                print(f"  {done}/{len(jobs)}")
+            if output is not None and done % checkpoint == 0:
+                OpeningBook.save(output, entries)
+    return entries
+
+
+def read_book(file_name):
+    """Returns the entries of an existing book file (key -> (score, move, depth))."""
+    book = OpeningBook(file_name)
+    entries = {}
+    for index in range(book.count):
+        key, score, move_code, depth = book.RECORD.unpack_from(book.map, index * book.RECORD.size)
+        entries[key] = (score, engine_module.MOVE_CODES[move_code], depth)
+    book.close()
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the MiniChess opening book by searching the opening positions offline.")
+    parser.add_argument("--plies", type=int, default=4, help="book positions up to this many moves from the start")
+    parser.add_argument("--depth", type=int, default=6, help="search depth for each position")
+    parser.add_argument("--heuristics", nargs="+", choices=HEURISTICS, default=HEURISTICS, help="heuristics to build entries for")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="positions searched at the same time")
+    parser.add_argument("--output", default=engine_module.OPENING_BOOK_FILE, help="book file to write")
+    parser.add_argument("--checkpoint", type=int, default=CHECKPOINT_SEARCHES,
+                        help="write the book every this many searches during the build")
+    parser.add_argument("--fresh", action="store_true", help="ignore the entries of an existing book file")
+    args = parser.parse_args(argv)
+
+    existing = {}
+    if not args.fresh and os.path.exists(args.output):
+        existing = read_book(args.output)
+        print(f"Keeping {len(existing)} entries from {args.output}")
+
+    start_time = time.time()
+    entries = build_book(args.plies, args.depth, args.heuristics, args.workers, existing,
+                         args.output, max(1, args.checkpoint))
+    OpeningBook.save(args.output, entries)
+    print(f"Wrote {len(entries)} entries to {args.output} in {time.time() - start_time:.1f} sec")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
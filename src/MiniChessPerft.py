@@ -0,0 +1,114 @@
+import argparse
+import sys
+import time
+
+from MiniChessSkeletonCode import MiniChess
+
+# Reference leaf counts for depths 1, 2, 3, ... They were produced with the original
+# board-scanning move generator (get_piece_moves + make_move), independently of the
+# bitboard tables, so a mismatch means valid_moves or apply/undo changed behaviour.
+REFERENCE_POSITIONS = {
+    "start": ("bK bQ bB bN ./. . bp bp ./. . . . ./. wp wp . ./. wN wB wQ wK w",
+              [13, 170, 2452, 34813, 532546]),
+    "promotion": ("bK . bN . ./wp . . wp ./. . . . ./. bp . . bp/. . wN . wK w",
+                  [9, 76, 811, 8491, 108861]),
+    "promotion-black": ("bK . . . ./. . . . wp/. . . . ./bp . bp . ./. wN . . wK b",
+                        [7, 43, 508, 4650, 62952]),
+    "king-capture": ("bK . . . ./. . . wQ ./. bN . . ./. . wK . ./. . . . . w",
+                     [22, 171, 3001, 23692, 398175]),
+    "king-capture-black": ("bK bQ . . ./. . . . ./. wN bB . ./. . . . ./wK . . . wQ b",
+                           [18, 278, 4527, 72216, 1224281]),
+    "midgame": ("bK . bB bN ./bQ . bp . ./. wp . bp ./. . wp wN ./. . wB wQ wK b",
+                [18, 201, 3506, 47968, 833697]),
+}
+
+
+def perft(game, game_state, depth):
+    """
+    Counts the positions reached after exactly depth moves. A position where a
+    king has been captured is the end of the game and is not expanded further.
+    """
+    if depth == 0:
+        return 1
+    bitboards = game.get_bitboards(game_state)
+    if not bitboards['wK'] or not bitboards['bK']:
+        return 0
+    moves = game.valid_moves(game_state)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        game.apply_move(game_state, move)
+        nodes += perft(game, game_state, depth - 1)
+        game.undo_move(game_state)
+    return nodes
+
+
+def divide(game, game_state, depth):
+    """Returns (move, leaf count) for every root move, as perft(depth) split by first move."""
+    results = []
+    for move in game.valid_moves(game_state):
+        game.apply_move(game_state, move)
+        results.append((move, perft(game, game_state, depth - 1)))
+        game.undo_move(game_state)
+    return results
+
+
+def timed_perft(game, game_state, depth):
+    """Returns (leaf count, seconds, leaves per second)."""
+    start_time = time.perf_counter()
+    nodes = perft(game, game_state, depth)
+    elapsed = time.perf_counter() - start_time
+    return nodes, elapsed, nodes / elapsed if elapsed > 0 else 0.0
+
+
+def verify(game, max_depth):
+    """
+    Runs every reference position up to max_depth, printing counts and speed.
+    Returns True if all counts match.
+    """
+    all_passed = True
+    for name, (text, expected_counts) in REFERENCE_POSITIONS.items():
+        game_state = game.parse_position(text)
+        for depth, expected in enumerate(expected_counts[:max_depth], start=1):
+            nodes, elapsed, nps = timed_perft(game, game_state, depth)
+            status = "ok" if nodes == expected else f"MISMATCH (expected {expected})"
+            all_passed = all_passed and nodes == expected
+            print(f"{name:<20} depth {depth}: {nodes:>9} nodes  {elapsed:7.2f} sec  "
+                  f"{game.format_number(int(nps))} nps  {status}")
+    return all_passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft: count MiniChess move-generation leaf nodes.")
+    parser.add_argument("--depth", type=int, default=4, help="search depth in plies")
+    parser.add_argument("--position", help="position to count from (see MiniChess.parse_position); default is the start")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count under each root move")
+    parser.add_argument("--verify", action="store_true", help="check the stored reference counts up to --depth")
+    args = parser.parse_args(argv)
+
+    game = MiniChess()
+    if args.verify:
+        passed = verify(game, args.depth)
+        print("All perft counts match." if passed else "Perft counts DO NOT match the reference.")
+        return 0 if passed else 1
+
+    game_state = game.parse_position(args.position) if args.position else game.init_board()
+    if args.divide:
+        start_time = time.perf_counter()
+        results = divide(game, game_state, args.depth)
+        elapsed = time.perf_counter() - start_time
+        for move, nodes in results:
+            print(f"{game.format_move(move)}: {nodes}")
+        nodes = sum(count for _, count in results)
+        nps = nodes / elapsed if elapsed > 0 else 0.0
+    else:
+        nodes, elapsed, nps = timed_perft(game, game_state, args.depth)
+
+    print(f"\nDepth {args.depth}: {nodes} nodes in {elapsed:.2f} sec ({game.format_number(int(nps))} nps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, Position, HEURISTICS
+
+DEFAULT_PORT = 5470
+DEFAULT_DEPTH = 4  # plies searched when a request gives neither depth nor time
+SEARCH_MARGIN = 0.01  # engine TIME_MARGIN in the workers, so searches run close to their deadline
+DEADLINE_RESERVE = 0.02  # seconds of a deadline kept for getting the answer back from the worker
+
+# Each pool process keeps one MiniChess, so its tables stay warm between requests
+worker_game = None
+
+
+def init_worker(hash_mb):
+    global worker_game
+    engine_module.TT_SIZE_MB = hash_mb
+    engine_module.TIME_MARGIN = SEARCH_MARGIN
+    worker_game = MiniChess()
+    worker_game.verbose = False
+    # Scores are kept from white's side, so black searches minimize (as in mode 3) and the
+    # transposition table stays valid whichever side a request has to move
+    worker_game.ai_color = "white"
+
+
+def search_position(job):
+    """
+    Searches one position in a pool process. Returns the result dict sent back
+    to the client (score from the side to move's view), or None if the
+    deadline passed while the job waited for a process.
+    """
+    position, heuristic, algorithm, depth, time_limit, nodes, deadline = job
+    if deadline is not None:
+        time_left = deadline - time.time() - DEADLINE_RESERVE
+        if time_left <= 0:
+            return None
+        time_limit = min(time_limit, time_left)
+    game = worker_game
+    game_state = game.parse_position(position)
+    white = game_state["turn"] == "white"
+    engine_module.chosen_heuristic, engine_module.algorithm = heuristic, algorithm
+    engine_module.TIME_LIMIT = time_limit
+    engine_module.MAX_SEARCH_DEPTH = depth
+
+    bitboards = game.get_bitboards(game_state)
+    if not bitboards['wK'] or not bitboards['bK'] or not game.valid_moves(game_state):
+        # The game is over here: nothing to search
+        score = game.evaluate(game_state)
+        return {"score": score if white else -score, "move": None, "pv": [], "depth": 0, "nodes": 0}
+
+    start_nodes = game.cumulative_states_explored
+    game.node_limit = start_nodes + nodes if nodes else math.inf
+    try:
+        score, move = game.use_minimax(game_state, -math.inf, math.inf, white, time.time())
+    finally:
+        game.node_limit = math.inf
+    pv = game.principal_variation if game.search_stats is not None else [move]
+    return {
+        "score": score if white else -score,
+        "move": game.format_move(move) if move is not None else None,
+        "pv": [game.format_move(pv_move) for pv_move in pv if pv_move is not None],
+        "depth": game.completed_depth,
+        "nodes": game.cumulative_states_explored - start_nodes,
+    }
+
+
+def evaluate_positions(jobs):
+    """Static evaluation of a batch of (position, heuristic) in a pool process, each from the side to move's view."""
+    game = worker_game
+    scores = []
+    for position, heuristic in jobs:
+        engine_module.chosen_heuristic = heuristic
+        game_state = game.parse_position(position)
+        score = game.evaluate(game_state)
+        scores.append(score if game_state["turn"] == "white" else -score)
+    return scores
+
+
+class AnalysisService:
+    """
+    Local analysis server. Clients connect over TCP and send one JSON request
+    per line:
+
+      {"id": 7, "position": "bK bQ bB bN ./. . bp bp ./. . . . ./. wp wp . ./. wN wB wQ wK w",
+       "heuristic": "e1", "algorithm": "a", "depth": 5, "time": 1.0, "nodes": 100000, "deadline": 0.5}
+
+    position is in parse_position form and is the only required field.
+    heuristic (default e0) and algorithm (default a) are optional. depth, time
+    (seconds) and nodes limit the search; with none of them it searches to
+    DEFAULT_DEPTH. deadline is the number of seconds the client waits for the
+    answer, counted from arrival. Each answer is one JSON line with the same
+    id: score (from the side to move's view), move, pv, depth, nodes and
+    cached. On failure it has an error field instead. Answers come back as
+    searches finish, not in request order. {"command": "stats"} returns the
+    service counters.
+
+    The event loop only parses requests and looks up the cache. Searches run
+    in a pool of worker processes, each with its own MiniChess. At most
+    queue_size jobs are in the pool at a time, counting jobs whose requests
+    already gave up on their deadline; other requests wait for a slot, and
+    that wait counts against their deadline. A request for work that is
+    already under way (same cache key) waits for it instead of starting it
+    again, and is answered with cached set. Depth 0 requests are static
+    evaluations. They are gathered for up to batch_wait seconds (or until
+    batch_size are waiting) and sent to one worker as a single job. Results
+    are cached (least recently used first out) by position hash, heuristic
+    and limits. Time-limited results are cached too, so asking again returns
+    the earlier answer. Searches that a deadline cut short are not cached.
+    """
+
+    def __init__(self, workers, hash_mb=16, queue_size=64, cache_size=10000, batch_size=256, batch_wait=0.002):
+        self.workers = workers
+        self.hash_mb = hash_mb
+        self.queue_size = queue_size
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.pool = None
+        self.slots = None
+        self.cache = OrderedDict()
+        self.in_flight = {}  # cache key -> (deadline, compute task) of work not finished yet
+        self.pending_evals = []  # (position, heuristic, future) waiting for the next batch
+        self.batch_timer = None
+        self.counters = {"requests": 0, "cache_hits": 0, "searches": 0, "evaluations": 0, "batches": 0,
+                         "shared": 0, "deadline_misses": 0, "errors": 0}
+        self.game = MiniChess()  # for parsing positions in the event loop
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.hash_mb,))
+        self.slots = asyncio.Semaphore(self.queue_size)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def serve(self, host, port):
+        self.start()
+        server = await asyncio.start_server(self.handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def handle_client(self, reader, writer):
+        """Reads request lines from one connection and answers each as soon as it is done."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(line):
+            response = await self.handle_request(line)
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def handle_request(self, line):
+        """Answers one request line with the response dict."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request is a JSON object")
+        except ValueError as error:
+            self.counters["errors"] += 1
+            return {"error": f"bad request: {error}"}
+        response = {"id": request.get("id")}
+        if request.get("command") == "stats":
+            response.update(self.counters, cache_size=len(self.cache))
+            return response
+        self.counters["requests"] += 1
+        try:
+            response.update(await self.analyze(request))
+        except asyncio.TimeoutError:
+            self.counters["deadline_misses"] += 1
+            response["error"] = "deadline exceeded"
+        except (KeyError, TypeError, ValueError) as error:
+            self.counters["errors"] += 1
+            response["error"] = f"bad request: {error}"
+        return response
+
+    async def analyze(self, request):
+        """The result dict for one request, from the cache or the pool, within its deadline."""
+        position = request["position"]
+        game_state = self.game.parse_position(position)
+        heuristic = request.get("heuristic", "e0")
+        algorithm = request.get("algorithm", "a")
+        if heuristic not in HEURISTICS or algorithm not in ('m', 'a'):
+            raise ValueError(f"unknown heuristic {heuristic!r} or algorithm {algorithm!r}")
+        depth, time_limit, nodes = request.get("depth"), request.get("time"), request.get("nodes")
+        if depth is None and time_limit is None and nodes is None:
+            depth = DEFAULT_DEPTH
+        deadline = request.get("deadline")
+        deadline = time.time() + float(deadline) if deadline is not None else None
+
+        key = (Position.from_state(game_state).hash, heuristic, algorithm, depth, time_limit, nodes)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return dict(result, cached=True)
+
+        # Wait for the same work already under way, unless a tighter deadline than ours cuts it short
+        pending = self.in_flight.get(key)
+        if pending is not None and (pending[0] is None or (deadline is not None and pending[0] >= deadline)):
+            task, shared = pending[1], True
+            self.counters["shared"] += 1
+        else:
+            task, shared = asyncio.create_task(self.compute(key, position, heuristic, algorithm, depth, time_limit,
+                                                            nodes, deadline)), False
+            self.in_flight[key] = (deadline, task)
+            task.add_done_callback(lambda done: self.forget(key, done))
+
+        timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+        # Shielded: giving up on the deadline must not cancel the work other requests may share
+        result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        if result is None:
+            raise asyncio.TimeoutError()
+        return dict(result, cached=shared)
+
+    async def compute(self, key, position, heuristic, algorithm, depth, time_limit, nodes, deadline):
+        """Evaluates or searches one request in the pool and caches the result. None if the deadline passed first."""
+        if depth == 0:
+            result = await self.evaluate(position, heuristic)
+        else:
+            job = (position, heuristic, algorithm, int(depth) if depth else engine_module.MAX_SEARCH_DEPTH,
+                   float(time_limit) if time_limit is not None else math.inf, int(nodes) if nodes else None, deadline)
+            result = await self.search(job)
+            if result is None:
+                return None
+
+        # A search the deadline cut short is not the answer to the same request without one
+        if deadline is None or (depth is not None and result["depth"] >= depth):
+            self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def forget(self, key, task):
+        """Done callback of a compute task: later requests go to the cache (or start over) from now on."""
+        if self.in_flight.get(key, (None, None))[1] is task:
+            del self.in_flight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every request waiting for it gave up
+
+    async def search(self, job):
+        """
+        Runs search_position in the pool once a queue slot is free. The slot is
+        held until the process is done with the job, so at most queue_size jobs
+        are ever in the pool, whatever happens to the requests waiting on them.
+        """
+        await self.slots.acquire()
+        self.counters["searches"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self.pool, search_position, job)
+        future.add_done_callback(self.release_slot)
+        return await asyncio.shield(future)
+
+    def release_slot(self, future):
+        self.slots.release()
+        if not future.cancelled():
+            future.exception()  # retrieved here in case nobody waits for the result any more
+
+    async def evaluate(self, position, heuristic):
+        """Static evaluation of one position, sent to the pool with the others waiting in the same batch."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_evals.append((position, heuristic, future))
+        if len(self.pending_evals) >= self.batch_size:
+            self.flush_evaluations()
+        elif self.batch_timer is None:
+            self.batch_timer = asyncio.get_running_loop().call_later(self.batch_wait, self.flush_evaluations)
+        score = await future
+        return {"score": score, "move": None, "pv": [], "depth": 0, "nodes": 1}
+
+    def flush_evaluations(self):
+        """Sends the waiting depth 0 requests to the pool as one job."""
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        batch, self.pending_evals = self.pending_evals, []
+        if batch:
+            asyncio.create_task(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        async with self.slots:
+            self.counters["batches"] += 1
+            self.counters["evaluations"] += len(batch)
+            try:
+                scores = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, evaluate_positions, [(position, heuristic) for position, heuristic, _ in batch])
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+        for (_, _, future), score in zip(batch, scores):
+            if not future.done():  # its request may have given up on its deadline
+                future.set_result(score)
+
+
+async def send_requests(host, port, requests):
+    """Sends requests (dicts) over one connection and returns the responses in request order."""
+    reader, writer = await asyncio.open_connection(host, port)
+    for number, request in enumerate(requests):
+        writer.write((json.dumps(dict(request, id=number)) + "\n").encode())
+    await writer.drain()
+    responses = [None] * len(requests)
+    for _ in requests:
+        response = json.loads(await reader.readline())
+        responses[response["id"]] = response
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local MiniChess analysis service: position searches and "
+                                                 "evaluations over TCP, one JSON request per line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="search processes")
+    serve.add_argument("--hash-mb", type=float, default=engine_module.TT_SIZE_MB,
+                       help="transposition table size of each search process")
+    serve.add_argument("--queue", type=int, default=64, help="jobs submitted to the processes at a time")
+    serve.add_argument("--cache", type=int, default=10000, help="results kept for repeated requests")
+    serve.add_argument("--batch", type=int, default=256, help="most depth 0 evaluations sent as one job")
+    serve.add_argument("--batch-wait", type=float, default=2.0,
+                       help="milliseconds a depth 0 evaluation waits for others to share its job")
+
+    query = commands.add_parser("query", help="send positions to a running service and print the answers")
+    query.add_argument("positions", nargs="+", help="positions in parse_position form")
+    query.add_argument("--host", default="127.0.0.1")
+    query.add_argument("--port", type=int, default=DEFAULT_PORT)
+    query.add_argument("--heuristic", choices=HEURISTICS, default='e0')
+    query.add_argument("--algorithm", choices=['m', 'a'], default='a')
+    query.add_argument("--depth", type=int, help=f"plies to search, 0 for a static evaluation (default {DEFAULT_DEPTH})")
+    query.add_argument("--time", type=float, help="seconds to search")
+    query.add_argument("--nodes", type=int, help="nodes to search")
+    query.add_argument("--deadline", type=float, help="seconds to wait for each answer")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        service = AnalysisService(args.workers, args.hash_mb, args.queue, args.cache, args.batch, args.batch_wait / 1000.0)
+        print(f"Serving on {args.host}:{args.port} with {args.workers} processes", flush=True)
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    limits = {name: value for name, value in (("depth", args.depth), ("time", args.time), ("nodes", args.nodes),
+                                              ("deadline", args.deadline)) if value is not None}
+    requests = [dict(limits, position=position, heuristic=args.heuristic, algorithm=args.algorithm)
+                for position in args.positions]
+    for position, response in zip(args.positions, asyncio.run(send_requests(args.host, args.port, requests))):
+        print(position)
+        print("  " + json.dumps({key: value for key, value in response.items() if key != "id"}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
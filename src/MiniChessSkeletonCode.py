@@ -1,13 +1,28 @@
 import math
-import copy
 import time
+import random
 import argparse
+import atexit
+import multiprocessing
+import queue
+import json
+import mmap
+import os
+import struct
+from array import array
+import threading
+from multiprocessing import shared_memory
 import sys, traceback
+try:
+    import numpy  # optional: only the batched leaf evaluation (BATCH_EVAL) uses it
+except ImportError:
+    numpy = None
 
 NumOfMoves = 0
 WhiteMoveCounter = 1
 BlackMoveCounter = 1
 TIME_LIMIT = 0  
+TIME_MARGIN = 0.15  # seconds before TIME_LIMIT at which the search stops taking on new moves
 player1_color = 'w'
 algorithm = None
 max_turns = 10
@@ -15,6 +30,948 @@ mode = None
 chosen_heuristic = 'e0'
 chosen_heuristic_1 = 'e0'
 chosen_heuristic_2 = 'e0'
+TT_SIZE_MB = 16  # memory given to the transposition table
+HASH_FILE = None  # if set, the transposition table is kept across games, saved here after each one and mapped back at start
+MAX_SEARCH_DEPTH = 64  # safety ceiling for iterative deepening, far beyond what the clock allows
+QUIESCENCE_DEPTH = 4  # capture-only plies searched past the horizon (0 turns quiescence off)
+BATCH_EVAL = False  # score the children of last-ply nodes together with NumPy (e0, e1, e4; needs numpy)
+SEARCH_STATS_FILE = None  # file that gets one JSON line of SearchStats per AI search, if set
+PONDER = False  # in Player vs AI mode, search the expected reply while the human thinks
+SEARCH_WORKERS = 1  # processes searching each AI move (Lazy SMP); 1 searches in this process only
+HEURISTICS = ['e0', 'e1', 'e2', 'e3', 'e4']
+TRACE_LEVELS = ['off', 'summary', 'full']
+TRACE_LEVEL = 'full'  # how much of each game goes in the gameTrace file
+TRACE_BACKGROUND = False  # write the gameTrace file from a helper thread
+TRACE_FORMAT = 'text'  # 'text' (gameTrace-*.txt) or 'jsonl' (gameTrace-*.jsonl plus a move index)
+# Opening book written by MiniChessBook.py, looked up before searching when the file exists
+OPENING_BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openingBook.bin")
+USE_OPENING_BOOK = True
+# Endgame tables written by MiniChessTablebase.py, probed during search when the directory has any
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase")
+USE_TABLEBASE = True
+TABLEBASE_WIN = 900  # score of a won table position, less the plies to the win; below a captured king (999)
+
+# Bitboard tables. Square index is row * 5 + col, so walking the bits from the lowest
+# up visits the squares in the same order as the old row-by-row board scan.
+KING_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_JUMPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+PIECE_NAMES = ['wK', 'wQ', 'wB', 'wN', 'wp', 'bK', 'bQ', 'bB', 'bN', 'bp']
+
+SQUARES = [(sq // 5, sq % 5) for sq in range(25)]
+SQUARE_BITS = [1 << sq for sq in range(25)]
+# MOVE_TUPLES[from][to] is the shared ((row, col), (row, col)) tuple for that move
+MOVE_TUPLES = [[(SQUARES[a], SQUARES[b]) for b in range(25)] for a in range(25)]
+
+
+def build_steps(row, col, offsets):
+    """Returns the (target bit, move) pairs for single-step offsets from (row, col)."""
+    steps = []
+    for dr, dc in offsets:
+        new_row, new_col = row + dr, col + dc
+        if 0 <= new_row < 5 and 0 <= new_col < 5:
+            steps.append((SQUARE_BITS[new_row * 5 + new_col], MOVE_TUPLES[row * 5 + col][new_row * 5 + new_col]))
+    return steps
+
+
+def build_rays(row, col, directions):
+    """Returns one list of (target bit, move) pairs per direction, nearest square first."""
+    rays = []
+    for dr, dc in directions:
+        ray = []
+        new_row, new_col = row + dr, col + dc
+        while 0 <= new_row < 5 and 0 <= new_col < 5:
+            ray.append((SQUARE_BITS[new_row * 5 + new_col], MOVE_TUPLES[row * 5 + col][new_row * 5 + new_col]))
+            new_row, new_col = new_row + dr, new_col + dc
+        if ray:
+            rays.append(ray)
+    return rays
+
+
+def steps_mask(steps):
+    mask = 0
+    for bit, _ in steps:
+        mask |= bit
+    return mask
+
+
+KING_STEPS = [build_steps(r, c, KING_DIRECTIONS) for r, c in SQUARES]
+KNIGHT_STEPS = [build_steps(r, c, KNIGHT_JUMPS) for r, c in SQUARES]
+QUEEN_RAYS = [build_rays(r, c, KING_DIRECTIONS) for r, c in SQUARES]
+BISHOP_RAYS = [build_rays(r, c, BISHOP_DIRECTIONS) for r, c in SQUARES]
+# Pawn tables are indexed by color ('w' moves up the board, 'b' moves down)
+PAWN_PUSHES = {color: [build_steps(r, c, [(step, 0)]) for r, c in SQUARES] for color, step in (('w', -1), ('b', 1))}
+PAWN_CAPTURES = {color: [build_steps(r, c, [(step, -1), (step, 1)]) for r, c in SQUARES] for color, step in (('w', -1), ('b', 1))}
+
+KING_ATTACKS = [steps_mask(steps) for steps in KING_STEPS]
+KNIGHT_ATTACKS = [steps_mask(steps) for steps in KNIGHT_STEPS]
+PAWN_ATTACKS = {color: [steps_mask(steps) for steps in PAWN_CAPTURES[color]] for color in ('w', 'b')}
+QUEEN_RAY_MASKS = [steps_mask([step for ray in rays for step in ray]) for rays in QUEEN_RAYS]
+BISHOP_RAY_MASKS = [steps_mask([step for ray in rays for step in ray]) for rays in BISHOP_RAYS]
+# For attack queries: each ray from a square as a list of bits, flagged if it is diagonal
+ATTACK_RAYS = [[([bit for bit, _ in ray], dr != 0 and dc != 0) for dr, dc in KING_DIRECTIONS for ray in build_rays(r, c, [(dr, dc)])]
+               for r, c in SQUARES]
+
+
+def generate_piece_moves(piece, sq, own, opponent):
+    """
+    Returns the moves of piece standing on square sq, given the occupancy of its
+    own side and of the opponent, walking the step and ray tables in order.
+    """
+    moves = []
+    color, piece_type = piece[0], piece[1]
+    if piece_type == 'K' or piece_type == 'N':
+        for target, move in (KING_STEPS[sq] if piece_type == 'K' else KNIGHT_STEPS[sq]):
+            if not target & own:
+                moves.append(move)
+    elif piece_type == 'Q' or piece_type == 'B':
+        for ray in (QUEEN_RAYS[sq] if piece_type == 'Q' else BISHOP_RAYS[sq]):
+            for target, move in ray:
+                if target & own:
+                    break
+                moves.append(move)
+                if target & opponent:
+                    break
+    elif piece_type == 'p':
+        for target, move in PAWN_PUSHES[color][sq]:
+            if not target & (own | opponent):
+                moves.append(move)
+        for target, move in PAWN_CAPTURES[color][sq]:
+            if target & opponent:
+                moves.append(move)
+    return moves
+
+
+# REACH_MASKS[piece][sq] holds every square whose occupancy can change the moves of
+# piece on sq. MOVE_LOOKUP pairs that mask with a cache of move lists keyed on the
+# occupancy inside it, so each distinct neighbourhood is generated once and then shared.
+# A queen or bishop sees enough squares for millions of neighbourhoods, so each cache
+# is emptied once it holds MOVE_CACHE_SIZE lists: memory stays bounded in processes
+# that play for a long time, and only the lists in use get generated again.
+REACH_MASKS = {}
+for name in PIECE_NAMES:
+    if name[1] == 'K':
+        REACH_MASKS[name] = KING_ATTACKS
+    elif name[1] == 'N':
+        REACH_MASKS[name] = KNIGHT_ATTACKS
+    elif name[1] == 'Q':
+        REACH_MASKS[name] = QUEEN_RAY_MASKS
+    elif name[1] == 'B':
+        REACH_MASKS[name] = BISHOP_RAY_MASKS
+    else:
+        REACH_MASKS[name] = [PAWN_ATTACKS[name[0]][sq] | steps_mask(PAWN_PUSHES[name[0]][sq]) for sq in range(25)]
+MOVE_CACHE_SIZE = 512
+MOVE_LOOKUP = {name: [(REACH_MASKS[name][sq], {}) for sq in range(25)] for name in PIECE_NAMES}
+
+# Zobrist keys, seeded so hashes are the same from one run to the next
+zobrist_random = random.Random(472)
+ZOBRIST_PIECES = {name: [zobrist_random.getrandbits(64) for _ in range(25)] for name in PIECE_NAMES}
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+# Mixed into transposition keys so scores from different heuristics never meet
+ZOBRIST_HEURISTICS = {name: zobrist_random.getrandbits(64) for name in HEURISTICS}
+# MOVE_CODES[code] turns a move packed as from * 25 + to + 1 back into its tuple (0 = no move)
+MOVE_CODES = [None] + [MOVE_TUPLES[a][b] for a in range(25) for b in range(25)]
+
+# Evaluation tables, built once at load time. Each one gives the contribution of a
+# piece on a square, so make/unmake can keep the board's total up to date instead of
+# the evaluators rescanning all 25 squares. Fractional terms are kept as scaled
+# integers so the running totals never drift.
+PIECE_VALUES = {'p': 1, 'B': 3, 'N': 3, 'Q': 9, 'K': 999}
+# How much more than the captured piece's value a capture may still be worth, for delta pruning in quiescence
+DELTA_MARGIN = 2
+# Move ordering keys (see MiniChess.order_moves): captures above killers above history scores
+CAPTURE_ORDER = 3_000_000
+KILLER_ORDER = 2_000_000
+# Principal variation search asks whether a move beats the best score so far with the window
+# (alpha, alpha + NULL_WINDOW); it only has to be narrower than the gap between two different scores
+NULL_WINDOW = 1e-6
+# Half-width of the first aspiration window around the previous iteration's score (a pawn),
+# doubled on each failure until the window covers the won and lost scores as well
+ASPIRATION_WINDOW = 1.0
+E1_CENTER_SQUARES = {(2, 2), (2, 3), (3, 2), (3, 3)}
+
+PIECE_SQUARE_TABLE_E4 = {
+    
+    # Black tables (row 0 is black’s back rank, row 4 is black’s front)
+    'bp': [
+        [2,  2,  2,  2,  2 ],
+        [2.25,  2.3,  2.3,  2.3,  2.3 ],
+        [3.1,  3.3,  3.3,  3.3,  3.1 ],
+        [3.15, 3.4,  3.4,  3.4,  3.15],
+        [4,  4,  4,  4,  4 ],
+    ],
+    'bN': [
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+        [1.3, 2.4, 2.4, 2.4, 1.3],
+        [1.3, 2.4, 3.5, 2.4, 1.3],
+        [1.3, 2.4, 2.4, 2.4, 1.3],
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+    ],
+    'bB': [
+        [1.3, 1.4, 1.4, 1.4, 1.3],
+        [1.3, 2.6, 2.6, 2.6, 1.3],
+        [1.4, 2.6, 2.75, 2.6, 1.4],
+        [1.3, 2.6, 2.6, 2.6, 1.3],
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+    ],
+    'bQ': [
+        [1.5, 1.5, 1.5, 1.5, 1.5],
+        [1.5, 2.6, 2.6, 2.6, 1.5],
+        [1.5, 2.6, 3.7, 2.6, 1.5],
+        [1.5, 2.6, 2.6, 2.6, 1.5],
+        [1.5, 1.5, 1.5, 1.5, 1.5],
+    ],
+    'bK': [
+        [0.2, 0.2, 0.2, 0.2, 0.2],
+        [0.2, 1.4, 1.4, 1.4, 0.2],
+        [0.2, 1.4, 0.2, 1.4, 0.2],
+        [0.2, 1.4, 1.4, 1.4, 0.2],
+        [0.2, 0.2, 0.2, 0.2, 0.2],
+    ],
+    # White tables (row 0 is top, row 4 is bottom)
+    'wp': [
+        [4,  4,  4,  4,  4 ],
+        [3.15, 3.4,  3.4,  3.4,  3.15],
+        [3.1,  3.3,  3.3,  3.3,  3.1 ],
+        [2.25,  2.3,  2.3,  2.3,  2.3 ],
+        [2,  2,  2,  2,  2 ],
+    ],
+    'wN': [
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+        [1.3, 2.4, 2.4, 2.4, 1.3],
+        [1.3, 2.4, 3.5, 2.4, 1.3],
+        [1.3, 2.4, 2.4, 2.4, 1.3],
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+    ],
+    'wB': [
+        [1.3, 1.4, 1.4, 1.4, 1.3],
+        [1.3, 2.6, 2.6, 2.6, 1.3],
+        [1.4, 2.6, 2.75, 2.6, 1.4],
+        [1.3, 2.6, 2.6, 2.6, 1.3],
+        [1.2, 1.3, 1.3, 1.3, 1.2],
+    ],
+    'wQ': [
+        [1.5, 1.5, 1.5, 1.5, 1.5],
+        [1.5, 2.6, 2.6, 2.6, 1.5],
+        [1.5, 2.6, 3.7, 2.6, 1.5],
+        [1.5, 2.6, 2.6, 2.6, 1.5],
+        [1.5, 1.5, 1.5, 1.5, 1.5],
+    ],
+    'wK': [
+        [0.2, 0.2, 0.2, 0.2, 0.2],
+        [0.2, 1.4, 1.4, 1.4, 0.2],
+        [0.2, 1.4, 0.2, 1.4, 0.2],
+        [0.2, 1.4, 1.4, 1.4, 0.2],
+        [0.2, 0.2, 0.2, 0.2, 0.2],
+    ],
+}
+
+
+def build_eval_tables():
+    """
+    Returns per-piece, per-square tables for the incremental terms:
+      material: signed piece value (white positive), as used by e0
+      e1:       signed value + 0.2 on the center - 0.3 for a king on the edge, times 10
+      psq:      PIECE_SQUARE_TABLE_E4 entry, times 100
+    """
+    material, e1, psq = {}, {}, {}
+    for name in PIECE_NAMES:
+        sign = 1 if name[0] == 'w' else -1
+        value = PIECE_VALUES[name[1]]
+        material[name] = [sign * value] * 25
+        e1[name] = []
+        psq[name] = []
+        for r, c in SQUARES:
+            term = 10 * value
+            if (r, c) in E1_CENTER_SQUARES:
+                term += 2
+            if name[1] == 'K' and (r == 0 or r == 4 or c == 0 or c == 4):
+                term -= 3
+            e1[name].append(sign * term)
+            psq[name].append(round(PIECE_SQUARE_TABLE_E4[name][r][c] * 100))
+    return material, e1, psq
+
+
+MATERIAL_TABLE, E1_TABLE, PSQ_TABLE_E4 = build_eval_tables()
+# Bitboard entries that hold occupancy or running totals rather than one piece
+INCREMENTAL_KEYS = ['w', 'b', 'hash', 'material', 'e1', 'psq']
+
+# Compact boards (Position, and the int8 arrays of the batched leaf evaluation) hold
+# one piece code per square: 0 for an empty square, 1 + the PIECE_NAMES index otherwise
+PIECE_CODES = {'.': 0, **{name: code for code, name in enumerate(PIECE_NAMES, start=1)}}
+CODE_NAMES = ['.'] + PIECE_NAMES
+CODE_ZOBRIST = [[0] * 25] + [ZOBRIST_PIECES[name] for name in PIECE_NAMES]
+BATCH_HEURISTICS = ['e0', 'e1', 'e4']
+
+
+def build_batch_tables():
+    """
+    Returns the NumPy lookup tables of MiniChess.evaluate_batch, indexed by
+    piece code (and square):
+      sign:      +1 white, -1 black, 0 empty
+      material:  signed piece value, as MATERIAL_TABLE
+      king:      1 for a king
+      threat:    e4's bonus for threatening the piece (2 for Q and K, 1 otherwise)
+      psq:       PSQ_TABLE_E4 entry, times 100
+      center:    e1's center squares, edge: the border squares (e1's king penalty)
+      reach:     [code, from, to] the piece can capture on to from an empty board
+      between:   [from, to, sq] sq lies strictly between from and to on a line
+      promotion: the code a piece becomes on its last rank, last_rank: [code, to]
+    """
+    codes = len(PIECE_CODES)
+    tables = {
+        "sign": numpy.zeros(codes, dtype=numpy.int64),
+        "material": numpy.zeros(codes, dtype=numpy.int64),
+        "king": numpy.zeros(codes, dtype=numpy.int64),
+        "threat": numpy.zeros(codes, dtype=numpy.int64),
+        "psq": numpy.zeros((codes, 25), dtype=numpy.int64),
+        "center": numpy.array([(r, c) in E1_CENTER_SQUARES for r, c in SQUARES], dtype=numpy.int64),
+        "edge": numpy.array([r == 0 or r == 4 or c == 0 or c == 4 for r, c in SQUARES], dtype=numpy.int64),
+        "reach": numpy.zeros((codes, 25, 25), dtype=bool),
+        "between": numpy.zeros((25, 25, 25), dtype=numpy.float32),
+        "promotion": numpy.arange(codes, dtype=numpy.int8),
+        "last_rank": numpy.zeros((codes, 25), dtype=bool),
+    }
+    for name in PIECE_NAMES:
+        code = PIECE_CODES[name]
+        tables["sign"][code] = 1 if name[0] == 'w' else -1
+        tables["material"][code] = MATERIAL_TABLE[name][0]
+        tables["king"][code] = name[1] == 'K'
+        tables["threat"][code] = 2 if name[1] in ['Q', 'K'] else 1
+        tables["psq"][code] = PSQ_TABLE_E4[name]
+        for sq in range(25):
+            if name[1] == 'p':
+                reach = PAWN_ATTACKS[name[0]][sq]
+            else:
+                reach = REACH_MASKS[name][sq]
+            for target in range(25):
+                tables["reach"][code, sq, target] = bool(reach & SQUARE_BITS[target])
+        if name[1] == 'p':
+            tables["promotion"][code] = PIECE_CODES[name[0] + 'Q']
+            last_row = 0 if name[0] == 'w' else 4
+            tables["last_rank"][code, last_row * 5:last_row * 5 + 5] = True
+    for sq, rays in enumerate(QUEEN_RAYS):
+        for ray in rays:
+            squares = [bit.bit_length() - 1 for bit, _ in ray]
+            for index, target in enumerate(squares):
+                tables["between"][sq, target, squares[:index]] = 1
+    # Flattened for one matrix product: occupancy (n, 25) @ between -> (n, from * 25 + to)
+    tables["between"] = tables["between"].reshape(625, 25).T.copy()
+    return tables
+
+
+BATCH_TABLES = build_batch_tables() if numpy is not None else None
+
+
+class Position:
+    """
+    Compact, self-contained copy of a game state for storing and sending
+    positions: a bytearray of 25 piece codes (see PIECE_CODES), the side to
+    move as an integer (WHITE or BLACK), the king squares (None once a king
+    is captured) and the Zobrist hash, equal to MiniChess.get_hash of the
+    same state. Positions compare and hash by board and side to move.
+    The search keeps working in place on the game_state dict; from_state and
+    to_state convert between the two.
+    """
+    __slots__ = ('board', 'side', 'kings', 'hash')
+    WHITE = 0
+    BLACK = 1
+
+    def __init__(self, board, side, kings=None, key=None):
+        self.board = bytearray(board) if isinstance(board, bytes) else board
+        self.side = side
+        if kings is None:
+            kings = (board.find(PIECE_CODES['wK']), board.find(PIECE_CODES['bK']))
+            kings = tuple(sq if sq >= 0 else None for sq in kings)
+        self.kings = kings
+        if key is None:
+            key = ZOBRIST_BLACK_TO_MOVE if side == self.BLACK else 0
+            for sq, code in enumerate(board):
+                key ^= CODE_ZOBRIST[code][sq]
+        self.hash = key
+
+    @classmethod
+    def from_state(cls, game_state):
+        board = bytearray(PIECE_CODES[piece] for row in game_state["board"] for piece in row)
+        return cls(board, cls.WHITE if game_state["turn"] == "white" else cls.BLACK)
+
+    def to_state(self):
+        """A new game_state dict (board rows of piece names and "turn") for this position."""
+        board = [[CODE_NAMES[code] for code in self.board[row * 5:row * 5 + 5]] for row in range(5)]
+        return {"board": board, "turn": self.turn}
+
+    @property
+    def turn(self):
+        return "white" if self.side == self.WHITE else "black"
+
+    def piece(self, sq):
+        """Name of the piece on square sq ('wK', ...) or '.'."""
+        return CODE_NAMES[self.board[sq]]
+
+    def copy(self):
+        return Position(bytearray(self.board), self.side, self.kings, self.hash)
+
+    def play(self, move):
+        """
+        Returns the position after move (a move of valid_moves), with a pawn on
+        its last rank promoted to a queen, as apply_move plays it.
+        """
+        (start_row, start_col), (end_row, end_col) = move
+        start, end = start_row * 5 + start_col, end_row * 5 + end_col
+        board = bytearray(self.board)
+        piece, captured = board[start], board[end]
+        key = self.hash ^ ZOBRIST_BLACK_TO_MOVE ^ CODE_ZOBRIST[piece][start] ^ CODE_ZOBRIST[captured][end]
+        if piece == PIECE_CODES['wp'] and end_row == 0:
+            piece = PIECE_CODES['wQ']
+        elif piece == PIECE_CODES['bp'] and end_row == 4:
+            piece = PIECE_CODES['bQ']
+        key ^= CODE_ZOBRIST[piece][end]
+        board[start], board[end] = 0, piece
+
+        white_king, black_king = self.kings
+        if piece == PIECE_CODES['wK']:
+            white_king = end
+        elif piece == PIECE_CODES['bK']:
+            black_king = end
+        if captured == PIECE_CODES['wK']:
+            white_king = None
+        elif captured == PIECE_CODES['bK']:
+            black_king = None
+        return Position(board, 1 - self.side, (white_king, black_king), key)
+
+    def __reduce__(self):
+        # Pickles as the constructor arguments, without the slot names
+        return Position, (bytes(self.board), self.side, self.kings, self.hash)
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self.side == other.side and self.board == other.board
+
+    def __hash__(self):
+        return hash(self.hash)
+
+    def __repr__(self):
+        rows = '/'.join(' '.join(self.piece(row * 5 + col) for col in range(5)) for row in range(5))
+        return f"Position({rows} {self.turn[0]})"
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table keyed by Zobrist hash. Every bucket holds two
+    entries: the first keeps the deepest recent search seen for its bucket, the
+    second is always replaced. Keys, scores and packed (depth, bound, best move,
+    generation) words live in three preallocated arrays over a single buffer,
+    so memory use never grows during a game.
+
+    The generation counts searches (new_search). A deep entry older than
+    MAX_AGE searches still answers probes, but no longer holds on to the first
+    slot, so positions that are gone from the game (or from earlier games, in a
+    saved table) give way to the current ones.
+
+    The buffer can be handed in (e.g. a multiprocessing.shared_memory block) so
+    several search processes share one table. Writes are not locked: each key
+    is stored XORed with its score and data words, so an entry torn by two
+    concurrent writers simply fails the key check on the next probe.
+
+    save writes the table to a file as a 16-byte header (magic, version,
+    generation, side the scores are from, entry count) followed by the buffer
+    as it is in memory; load memory-maps such a file back copy-on-write, so a
+    warm table costs nothing to open and the file only changes on the next save.
+    """
+    EXACT = 0
+    LOWER = 1  # score is at least this good (the search failed high)
+    UPPER = 2  # score is at most this good (the search failed low)
+    ENTRY_BYTES = 24
+    MAX_AGE = 8  # searches a deeper entry keeps the first slot for
+    FILE_HEADER = struct.Struct('<4sBBBxQ')
+    FILE_MAGIC = b'MCTT'
+    FILE_VERSION = 1
+
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            buffer = bytearray(self.buffer_size(size_mb))
+        entries = len(buffer) // (2 * self.ENTRY_BYTES) * 2
+        self.num_buckets = entries // 2
+        self.buffer = buffer
+        self.generation = 0
+        self.map = None  # the file mapping, for tables opened by load
+        view = memoryview(buffer)
+        self.keys = view[:entries * 8].cast('Q')
+        self.scores = view[entries * 8:entries * 16].cast('d')
+        self.score_bits = view[entries * 8:entries * 16].cast('Q')
+        self.data = view[entries * 16:entries * 24].cast('Q')
+
+    @classmethod
+    def buffer_size(cls, size_mb):
+        """Bytes needed for a table of about size_mb megabytes (at least one bucket)."""
+        return max(1, int(size_mb * 1024 * 1024) // (2 * cls.ENTRY_BYTES)) * 2 * cls.ENTRY_BYTES
+
+    def probe(self, key):
+        """Returns (score, depth, bound, best_move) stored for key, or None."""
+        slot = (key % self.num_buckets) * 2
+        data = self.data[slot]
+        if self.keys[slot] ^ data ^ self.score_bits[slot] != key:
+            slot += 1
+            data = self.data[slot]
+            if self.keys[slot] ^ data ^ self.score_bits[slot] != key:
+                return None
+        return self.scores[slot], data & 0xFF, (data >> 8) & 3, MOVE_CODES[(data >> 10) & 0x3FF]
+
+    def store(self, key, depth, bound, score, best_move):
+        slot = (key % self.num_buckets) * 2
+        # Keep the deeper of recent results in the first slot, anything else goes to the second
+        data = self.data[slot]
+        if (self.keys[slot] ^ data ^ self.score_bits[slot] != key and depth < (data & 0xFF)
+                and (self.generation - (data >> 20)) & 0xFF < self.MAX_AGE):
+            slot += 1
+        move_code = 0
+        if best_move is not None:
+            (start_row, start_col), (end_row, end_col) = best_move
+            move_code = (start_row * 5 + start_col) * 25 + end_row * 5 + end_col + 1
+        data = depth | (bound << 8) | (move_code << 10) | (self.generation << 20)
+        self.scores[slot] = score
+        self.data[slot] = data
+        self.keys[slot] = key ^ data ^ self.score_bits[slot]
+
+    def new_search(self):
+        """Starts the next search: every stored entry is one generation older."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+        self.generation = 0
+
+    def save(self, file_name, side):
+        """
+        Writes the table to file_name; side is the color its scores are from
+        (the searching AI's). The file is replaced in one step, so a table
+        memory-mapped from it stays valid.
+        """
+        temp_name = file_name + ".part"
+        with open(temp_name, "wb") as f:
+            f.write(self.FILE_HEADER.pack(self.FILE_MAGIC, self.FILE_VERSION, self.generation,
+                                          Position.WHITE if side == "white" else Position.BLACK,
+                                          self.num_buckets * 2))
+            f.write(self.buffer)
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Opens a table written by save. Returns (table, side its scores are
+        from), or None when the file is missing or not a table file.
+        """
+        try:
+            with open(file_name, "rb") as f:
+                header = f.read(cls.FILE_HEADER.size)
+                if len(header) < cls.FILE_HEADER.size:
+                    return None
+                magic, version, generation, side, entries = cls.FILE_HEADER.unpack(header)
+                size = f.seek(0, 2)
+                if (magic != cls.FILE_MAGIC or version != cls.FILE_VERSION or side > 1 or entries == 0
+                        or size != cls.FILE_HEADER.size + entries * cls.ENTRY_BYTES):
+                    return None
+                # Copy-on-write: searching writes to private pages, never to the file
+                table_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except OSError:
+            return None
+        table = cls(buffer=memoryview(table_map)[cls.FILE_HEADER.size:])
+        table.map = table_map
+        table.generation = generation
+        return table, "white" if side == Position.WHITE else "black"
+
+    def release(self):
+        """Drops the views into the buffer, so a shared memory block (or the file mapping) can be closed."""
+        for view in (self.keys, self.scores, self.score_bits, self.data):
+            view.release()
+        if self.map is not None:
+            self.buffer.release()
+            self.map.close()
+            self.map = None
+
+
+class OpeningBook:
+    """
+    Searched results for the opening positions, written by MiniChessBook.py.
+    The file is a run of fixed 20-byte records (key, score, move code, depth)
+    sorted by key, where the key is the position's transposition key for one
+    heuristic and the score is from the side to move's point of view. It is
+    memory-mapped and binary-searched, so opening it reads nothing up front.
+    """
+
+    RECORD = struct.Struct('<QdHH')
+
+    def __init__(self, file_name):
+        self.file = open(file_name, "rb")
+        size = self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.count = size // self.RECORD.size
+
+    @classmethod
+    def save(cls, file_name, entries):
+        """
+        Writes entries, a dict of key -> (score, move, depth), as a sorted book
+        file. The file is replaced in one step, so a book memory-mapped from it
+        stays valid and an interrupted write leaves the old book in place.
+        """
+        temp_name = file_name + ".part"
+        with open(temp_name, "wb") as f:
+            for key in sorted(entries):
+                score, move, depth = entries[key]
+                (start_row, start_col), (end_row, end_col) = move
+                move_code = (start_row * 5 + start_col) * 25 + end_row * 5 + end_col + 1
+                f.write(cls.RECORD.pack(key, score, move_code, depth))
+        os.replace(temp_name, file_name)
+
+    def probe(self, key):
+        """Returns (score, depth, move) stored for key, or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key = struct.unpack_from('<Q', self.map, middle * self.RECORD.size)[0]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                _, score, move_code, depth = self.RECORD.unpack_from(self.map, middle * self.RECORD.size)
+                return score, depth, MOVE_CODES[move_code]
+        return None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+class Tablebase:
+    """
+    Endgame tables written by MiniChessTablebase.py, one file per material
+    signature (the pieces on the board, e.g. wK wQ bK) in a directory. A table
+    is a flat array of signed 16-bit values, one per placement and side to
+    move: 0 is a draw, +n means the side to move captures the king in n plies
+    with best play, -n that it loses its own king in n plies. Tables are
+    memory-mapped the first time a position with their signature is probed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        self.files = []
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            self.files = [name for name in os.listdir(directory) if name.endswith(".tb")]
+            self.max_pieces = max((len(name) // 2 - 1 for name in self.files), default=0)
+
+    @staticmethod
+    def file_name(directory, signature):
+        return os.path.join(directory, "".join(signature) + ".tb")
+
+    @staticmethod
+    def locate(bitboards, turn):
+        """
+        Returns (signature, index) of a position: the signature lists the pieces
+        in PIECE_NAMES order and the index packs their squares (ascending for
+        pieces of the same kind) in base 25, times two, plus one if black is to move.
+        """
+        signature = []
+        index = 0
+        for name in PIECE_NAMES:
+            bits = bitboards[name]
+            while bits:
+                low_bit = bits & -bits
+                signature.append(name)
+                index = index * 25 + low_bit.bit_length() - 1
+                bits ^= low_bit
+        return tuple(signature), index * 2 + (turn == "black")
+
+    def table(self, signature):
+        """The values of one signature, or None when there is no table for it."""
+        if signature not in self.tables:
+            table = None
+            file_name = self.file_name(self.directory, signature)
+            if os.path.exists(file_name):
+                with open(file_name, "rb") as f:
+                    table = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast('h')
+            self.tables[signature] = table
+        return self.tables[signature]
+
+    def probe(self, bitboards, turn):
+        """Value of the position for the side to move (see above), or None if it is not in the tables."""
+        if (bitboards['w'] | bitboards['b']).bit_count() > self.max_pieces:
+            return None
+        signature, index = self.locate(bitboards, turn)
+        table = self.table(signature)
+        return table[index] if table is not None else None
+
+
+class SearchStats:
+    """
+    Statistics of one iterative-deepening search, exported as one JSON line.
+    The search itself only bumps integer counters on MiniChess (see
+    MiniChess.search_counters); this object takes a snapshot of them when the
+    search starts and after every iteration, so it is cheap enough to keep on.
+    Per iteration it records the nodes, time, transposition table probes,
+    hits and cutoffs, beta cutoffs and the effective branching factor (nodes
+    of the iteration over nodes of the one before). Only the nodes of this
+    process are counted, not those of Lazy SMP helpers.
+    """
+    COUNTERS = ['nodes', 'quiescence_nodes', 'tt_probes', 'tt_hits', 'tt_cutoffs', 'beta_cutoffs',
+                'first_move_cutoffs', 'pvs_researches', 'aspiration_researches']
+
+    def __init__(self, counters, heuristic, algorithm, turn):
+        self.heuristic = heuristic
+        self.algorithm = algorithm
+        self.turn = turn
+        self.start_time = time.time()
+        self.start_counters = counters
+        self.last_time = self.start_time
+        self.last_counters = counters
+        self.iterations = []
+        self.seconds = 0.0
+        self.totals = dict.fromkeys(self.COUNTERS, 0)
+        self.depth = 0
+        self.score = None
+        self.move = None
+
+    def add_iteration(self, depth, counters, completed):
+        """Records one iteration from the counters at its end; completed is False if the clock cut it short."""
+        now = time.time()
+        iteration = {"depth": depth, "completed": completed, "seconds": now - self.last_time}
+        for name in self.COUNTERS:
+            iteration[name] = counters[name] - self.last_counters[name]
+        previous = self.iterations[-1] if self.iterations else None
+        iteration["ebf"] = (iteration["nodes"] / previous["nodes"]
+                            if completed and previous is not None and previous["completed"] and previous["nodes"] else None)
+        self.iterations.append(iteration)
+        self.last_time, self.last_counters = now, counters
+
+    def finish(self, counters, depth, score, move):
+        """Closes the search: completed depth, its score and move (as format_move writes it)."""
+        self.seconds = time.time() - self.start_time
+        self.totals = {name: counters[name] - self.start_counters[name] for name in self.COUNTERS}
+        self.depth, self.score, self.move = depth, score, move
+
+    def ebf(self):
+        """Geometric mean of the per-iteration branching factors, or None before two iterations completed."""
+        factors = [iteration["ebf"] for iteration in self.iterations if iteration["ebf"]]
+        return math.prod(factors) ** (1 / len(factors)) if factors else None
+
+    def to_dict(self):
+        totals = self.totals
+        return {
+            "heuristic": self.heuristic,
+            "algorithm": self.algorithm,
+            "turn": self.turn,
+            "depth": self.depth,
+            "score": self.score,
+            "move": self.move,
+            "seconds": self.seconds,
+            **totals,
+            "nps": totals["nodes"] / self.seconds if self.seconds > 0 else 0.0,
+            "tt_hit_rate": 100.0 * totals["tt_hits"] / totals["tt_probes"] if totals["tt_probes"] else 0.0,
+            "first_move_cutoff_rate": (100.0 * totals["first_move_cutoffs"] / totals["beta_cutoffs"]
+                                       if totals["beta_cutoffs"] else 0.0),
+            "ebf": self.ebf(),
+            "iterations": self.iterations,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+
+def format_number(num):
+    if num >= 1_000_000:
+        return f"{num / 1_000_000:.1f}M"
+    elif num >= 1_000:
+        return f"{num / 1_000:.1f}k"
+    else:
+        return str(num)
+
+
+class TraceWriter:
+    """
+    Writes one gameTrace file. The game hands it records (plain dicts) for the
+    game parameters, each move and the result; the file stays open for the
+    whole game and records are collected in memory until flush() (or every
+    flush_records records). With background=True a helper thread, fed through
+    a queue, formats and writes them. level is 'summary' (no board or AI
+    stats in the move records) or 'full'.
+    """
+
+    def __init__(self, file_name, level='full', background=False, flush_records=256):
+        self.file_name = file_name
+        self.level = level
+        self.flush_records = flush_records
+        self.pending = []
+        self.file = open(file_name, "w")
+        self.queue = None
+        self.thread = None
+        if background:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self.write_queued, daemon=True)
+            self.thread.start()
+
+    def write_header(self, record):
+        self.add(self.format_header, record)
+
+    def write_move(self, record):
+        self.add(self.format_move, record)
+
+    def write_result(self, record):
+        self.add(self.format_result, record)
+        self.flush()
+
+    def add(self, formatter, record):
+        self.pending.append((formatter, record))
+        if len(self.pending) >= self.flush_records:
+            self.flush()
+
+    def flush(self):
+        """Hands everything recorded so far to the file (or to the helper thread)."""
+        if not self.pending or self.file is None:
+            return
+        pending = self.pending
+        self.pending = []
+        if self.queue is not None:
+            self.queue.put(pending)
+        else:
+            self.write_records(pending)
+
+    def write_queued(self):
+        while True:
+            pending = self.queue.get()
+            if pending is None:
+                break
+            self.write_records(pending)
+
+    def write_records(self, pending):
+        self.file.write("".join(formatter(record) for formatter, record in pending))
+        self.file.flush()
+
+    def close(self):
+        """Flushes, waits for the helper thread and closes the file."""
+        if self.file is None:
+            return
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.file.close()
+        self.file = None
+
+    def format_header(self, record):
+        lines = ["Game Parameters:",
+                 f" - Timeout (t): {record['timeout']}",
+                 f" - Max Turns (m): {record['max_turns']}",
+                 f" - Player 1 color: {record['player1_color']}",
+                 f" - {record['players']}",
+                 f" - Alpha-Beta: {record['alpha_beta']}"]
+        if len(record["heuristics"]) > 0:
+            lines.append(f" - AI (one) Heuristic: {record['heuristics'][0]}")
+        if len(record["heuristics"]) > 1:
+            lines.append(f" - AI (two) Heuristic: {record['heuristics'][1]}")
+        lines.append("")
+        lines.append("Initial Board Configuration:")
+        lines.extend(" ".join(row) for row in record["board"])
+        return "\n".join(lines) + "\n"
+
+    def format_move(self, record):
+        lines = ["", "====================================",
+                 f"Player: {record['player']}",
+                 f"Turn #{record['turn']}",
+                 f"Action: Moved {record['piece']} from {record['from']} to {record['to']}"]
+        if record["capture"]:
+            lines.append(f"Captured piece: {record['capture']}")
+        if record["promotion"]:
+            lines.append(f"Pawn Promotion: {record['piece']} became a queen!")
+        if record["time"] is not None:
+            lines.append(f"Time for this action: {record['time']:.2f} sec")
+        if record["eval"] is not None:
+            lines.append(f"Heuristic score of resulting board: {record['eval']}")
+        if record["search_score"] is not None:
+            lines.append(f"Minimax/Alpha-Beta search score: {record['search_score']}")
+
+        if "board" in record:
+            lines.append("New Board Configuration:")
+            lines.extend(" ".join(row) for row in record["board"])
+        if "states" in record:
+            states = record["states"]
+            # Search depths in order, then the quiescence nodes ("q"), which are counted in the total too
+            states_by_depth = sorted(((int(depth), count) for depth, count in record["states_by_depth"].items()
+                                      if depth != "q"))
+            if "q" in record["states_by_depth"]:
+                states_by_depth.append(("q", record["states_by_depth"]["q"]))
+            total_states = float(states) if states else 1.0
+            lines.append("")
+            lines.append("AI Cumulative Info:")
+            lines.append(f" - Cumulative states explored: {format_number(states)}")
+            lines.append(" - Cumulative states explored by depth: "
+                         + ", ".join(f"{d}={format_number(count)}" for d, count in states_by_depth))
+            lines.append(" - Cumulative % states explored by depth: "
+                         + ", ".join(f"{d}={((count / total_states) * 100):.1f}%" for d, count in states_by_depth))
+            lines.append(f" - Average branching factor: {record['branching']:.1f}")
+            if "cutoff_rate" in record:
+                lines.append(f" - First-move cutoff rate: {record['cutoff_rate']:.1f}%")
+        return "\n".join(lines) + "\n"
+
+    def format_result(self, record):
+        if record["result"] == "DRAW":
+            text = "\n=== GAME OVER ===\nResult: DRAW\n"
+            if record["player"]:
+                text += f"Draw occurred after {record['player']}'s turn at turn #{record['turn']}\n"
+            return text
+        text = f"\n=== GAME OVER ===\nFinal result: {record['result']}\n"
+        if record.get("from"):
+            text += f"Decision move: ({record['from']} -> {record['to']})\nOccurred at turn #{record['turn']}\n"
+        return text
+
+
+class JsonlTraceWriter(TraceWriter):
+    """
+    Machine-readable gameTrace: one JSON object per line ("type" is "game",
+    "move" or "result"), with the same fields as the records. Next to the
+    .jsonl file it writes an .idx file holding the byte offset of every move
+    line as unsigned 64-bit integers, so move N can be read without scanning
+    (see MiniChessTraces.py).
+    """
+
+    def __init__(self, file_name, level='full', background=False, flush_records=256):
+        self.offset = 0
+        self.move_offsets = array('Q')
+        super().__init__(file_name, level, background, flush_records)
+
+    def format_header(self, record):
+        return self.format_line("game", record)
+
+    def format_move(self, record):
+        self.move_offsets.append(self.offset)
+        return self.format_line("move", record)
+
+    def format_result(self, record):
+        return self.format_line("result", record)
+
+    def format_line(self, record_type, record):
+        # Only ASCII is written, so the string length is the byte length
+        line = json.dumps({"type": record_type, **record}, separators=(",", ":")) + "\n"
+        self.offset += len(line)
+        return line
+
+    def close(self):
+        if self.file is None:
+            return
+        super().close()
+        with open(trace_index_name(self.file_name), "wb") as f:
+            self.move_offsets.tofile(f)
+
+
+def trace_index_name(file_name):
+    """Name of the move index written next to a .jsonl trace."""
+    return file_name[:-len(".jsonl")] + ".idx" if file_name.endswith(".jsonl") else file_name + ".idx"
+
 
 class MiniChess:
     def __init__(self):
@@ -24,10 +981,72 @@ class MiniChess:
         self.ai_color = None
         self.ai_colorH = None
         self.trace_file_name = None
+        self.trace = None  # TraceWriter for the game being played, None when not tracing
         self.heuristic_name = None
 
-        # Simple cache to remember positions
-        self.transposition_table = {}
+        # Bounded cache of searched positions, keyed by Zobrist hash
+        self.transposition_table = TranspositionTable(TT_SIZE_MB)
+        self.hash_file_opened = False  # see open_hash_file
+
+        # Moves played by apply_move during search, popped again by undo_move
+        self.undo_stack = []
+
+        # Iterative deepening state: the principal variation of the last completed
+        # iteration, whether the current node is still on it, and whether the
+        # clock stopped the current iteration
+        self.principal_variation = []
+        self.root_depth = 0
+        self.follow_pv = False
+        self.search_aborted = False
+        self.completed_depth = 0
+
+        # Opening book (see probe_opening_book), opened on first use
+        self.opening_book = None
+        self.opening_book_missing = False
+
+        # Endgame tables (see load_tablebase), None when there are none
+        self.tablebase = None
+        self.tablebase_loaded = False
+
+        # Move ordering (see order_moves): two killer moves per ply, a history score
+        # per side and move, and how often the first move searched caused the cutoff
+        self.killer_moves = []
+        self.history_table = [[0] * 625, [0] * 625]
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.quiescence_nodes = 0
+        # Searches repeated with a wider window: null-window moves that beat the best so far
+        # (principal variation search) and root iterations outside their aspiration window
+        self.pvs_researches = 0
+        self.aspiration_researches = 0
+        # Transposition table probes, probes that found the position, and probes that settled it
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        # SearchStats of the last search, and the file they are appended to (SEARCH_STATS_FILE)
+        self.search_stats = None
+        self.search_stats_file = None
+
+        # Pondering (see start_pondering): the background search, the position it searches and
+        # its result, whether it still runs on the opponent's time, and the flag that cancels it
+        self.ponder_thread = None
+        self.ponder_position = None
+        self.ponder_result = None
+        self.pondering = False
+        self.stop_search = False
+
+        # Limits and reporting for callers that drive the search themselves (MiniChessUCI.py):
+        # the cumulative_states_explored count at which the search stops like on the clock, and
+        # a function called with (depth, score, principal variation) after each completed iteration
+        self.node_limit = math.inf
+        self.on_iteration = None
+
+        # Lazy SMP helpers (see use_parallel_minimax), started on first use
+        self.search_worker_queues = []
+        self.search_processes = []
+        self.search_results = None
+        self.search_memory = None
+        self.search_job_id = 0
 
         # New attributes for AI stats
         self.cumulative_states_explored = 0
@@ -36,6 +1055,11 @@ class MiniChess:
         self.minimax_calls = 0
         self.last_move_info = None  # Track the most recent move and turn
 
+        # "WHITE WINS", "BLACK WINS", "DRAW", "MAX TURNS" or "EXITED" once the game is over
+        self.game_result = None
+        # Print boards and moves to the console (headless matches turn this off)
+        self.verbose = True
+
     def init_board(self):
         state = {
             "board":
@@ -74,16 +1098,104 @@ class MiniChess:
 
         return move in valid_moves
 
+    def build_bitboards(self, board):
+        """
+        Builds one 25-bit integer per piece name ('wK', 'bp', ...) plus the
+        occupancy of each color under the keys 'w' and 'b'. The same dict keeps
+        the running totals that are updated move by move: the Zobrist hash of
+        the piece placement ('hash') and the evaluation sums from
+        MATERIAL_TABLE, E1_TABLE and PSQ_TABLE_E4 ('material', 'e1', 'psq').
+        """
+        bitboards = {name: 0 for name in PIECE_NAMES}
+        for key in INCREMENTAL_KEYS:
+            bitboards[key] = 0
+        for sq, (row, col) in enumerate(SQUARES):
+            piece = board[row][col]
+            if piece != '.':
+                bitboards[piece] |= SQUARE_BITS[sq]
+                bitboards[piece[0]] |= SQUARE_BITS[sq]
+                bitboards['hash'] ^= ZOBRIST_PIECES[piece][sq]
+                bitboards['material'] += MATERIAL_TABLE[piece][sq]
+                bitboards['e1'] += E1_TABLE[piece][sq]
+                bitboards['psq'] += PSQ_TABLE_E4[piece][sq]
+        return bitboards
+
+    def get_bitboards(self, game_state):
+        """
+        Returns the bitboards stored alongside game_state, building them from the
+        board the first time. make_move keeps them in sync after that.
+        """
+        bitboards = game_state.get("bitboards")
+        if bitboards is None:
+            bitboards = self.build_bitboards(game_state["board"])
+            game_state["bitboards"] = bitboards
+        return bitboards
+
+    def update_bitboards(self, game_state, piece, start, end, captured_piece):
+        """Moves piece from start to end in the bitboards and running totals, removing captured_piece if any."""
+        bitboards = self.get_bitboards(game_state)
+        start_sq = start[0] * 5 + start[1]
+        end_sq = end[0] * 5 + end[1]
+        start_bit = SQUARE_BITS[start_sq]
+        end_bit = SQUARE_BITS[end_sq]
+        if captured_piece != '.':
+            bitboards[captured_piece] ^= end_bit
+            bitboards[captured_piece[0]] ^= end_bit
+            bitboards['hash'] ^= ZOBRIST_PIECES[captured_piece][end_sq]
+            bitboards['material'] -= MATERIAL_TABLE[captured_piece][end_sq]
+            bitboards['e1'] -= E1_TABLE[captured_piece][end_sq]
+            bitboards['psq'] -= PSQ_TABLE_E4[captured_piece][end_sq]
+        bitboards[piece] ^= start_bit | end_bit
+        bitboards[piece[0]] ^= start_bit | end_bit
+        bitboards['hash'] ^= ZOBRIST_PIECES[piece][start_sq] ^ ZOBRIST_PIECES[piece][end_sq]
+        bitboards['e1'] += E1_TABLE[piece][end_sq] - E1_TABLE[piece][start_sq]
+        bitboards['psq'] += PSQ_TABLE_E4[piece][end_sq] - PSQ_TABLE_E4[piece][start_sq]
+
+    def promote_in_bitboards(self, bitboards, pawn, sq):
+        """Replaces pawn on square sq by a queen of the same color in the bitboards and running totals."""
+        queen = pawn[0] + 'Q'
+        bitboards[pawn] ^= SQUARE_BITS[sq]
+        bitboards[queen] |= SQUARE_BITS[sq]
+        bitboards['hash'] ^= ZOBRIST_PIECES[pawn][sq] ^ ZOBRIST_PIECES[queen][sq]
+        bitboards['material'] += MATERIAL_TABLE[queen][sq] - MATERIAL_TABLE[pawn][sq]
+        bitboards['e1'] += E1_TABLE[queen][sq] - E1_TABLE[pawn][sq]
+        bitboards['psq'] += PSQ_TABLE_E4[queen][sq] - PSQ_TABLE_E4[pawn][sq]
+
+    def get_hash(self, game_state):
+        """Zobrist hash of the position: piece placement plus side to move."""
+        piece_hash = self.get_bitboards(game_state)['hash']
+        return piece_hash ^ ZOBRIST_BLACK_TO_MOVE if game_state["turn"] == "black" else piece_hash
+
     def valid_moves(self, game_state):
+        """
+        Generates all moves for the side to move from the bitboards. Each piece's
+        move list is looked up by the occupancy of the squares it can reach, so a
+        list is only built once (by generate_piece_moves) and reused afterwards.
+        Moves come out in the same order as scanning the board row by row with
+        get_piece_moves.
+        """
         moves = []
         board = game_state["board"]
-        turn = game_state["turn"]
-
-        for row in range(5):
-            for col in range(5):
-                piece = board[row][col]
-                if piece != '.' and ((turn == "white" and piece[0] == 'w') or (turn == "black" and piece[0] == 'b')):
-                    moves.extend(self.get_piece_moves(board, row, col, piece))
+        bitboards = self.get_bitboards(game_state)
+        if game_state["turn"] == "white":
+            own, opponent = bitboards['w'], bitboards['b']
+        else:
+            own, opponent = bitboards['b'], bitboards['w']
+
+        remaining = own
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            sq = bit.bit_length() - 1
+            piece = board[sq // 5][sq % 5]
+            mask, cache = MOVE_LOOKUP[piece][sq]
+            key = ((own & mask) << 25) | (opponent & mask)
+            piece_moves = cache.get(key)
+            if piece_moves is None:
+                if len(cache) >= MOVE_CACHE_SIZE:
+                    cache.clear()
+                piece_moves = cache[key] = generate_piece_moves(piece, sq, own, opponent)
+            moves += piece_moves
 
         return moves
 
@@ -186,6 +1298,7 @@ class MiniChess:
 
 
         # Move the piece
+        self.update_bitboards(game_state, piece, start, end, captured_piece)
         game_state["board"][start_row][start_col] = '.'
         game_state["board"][end_row][end_col] = piece
 
@@ -203,7 +1316,7 @@ class MiniChess:
             self.last_move_info = (current_player, turn_number, move)
 
             # Write move info to our trace file
-            if log_move and self.trace_file_name:
+            if log_move and self.trace:
 
                 # Convert from board indices to something like C3 -> C4
                 # Example: col -> letter, row -> number
@@ -212,84 +1325,43 @@ class MiniChess:
                 start_row_num = str(5 - start_row)
                 end_row_num = str(5 - end_row)
 
-                action_str = f"Moved {piece} from {start_col_letter}{start_row_num} to {end_col_letter}{end_row_num}"
-                
-                with open(self.trace_file_name, "a") as f:
-                    f.write("\n====================================\n")
-                    f.write(f"Player: {current_player}\n")
-                    
-                    if current_player == "White":
-                        f.write(f"Turn #{WhiteMoveCounter}\n")
-                    else:
-                        f.write(f"Turn #{BlackMoveCounter}\n")
-                    f.write(f"Action: {action_str}\n")
-                    
-                    if captured_piece != '.':
-                        f.write(f"Captured piece: {captured_piece}\n")
-                    
-                    if pawn_to_queen:
-                        f.write(f"Pawn Promotion: {piece} became a queen!\n")
-                    
+                record = {
+                    "player": current_player,
+                    "turn": turn_number,
+                    "piece": piece,
+                    "from": f"{start_col_letter}{start_row_num}",
+                    "to": f"{end_col_letter}{end_row_num}",
+                    "capture": captured_piece if captured_piece != '.' else None,
+                    "promotion": pawn_to_queen,
                     # If AI info is provided, log it
-                    if elapsed_time is not None:
-                        f.write(f"Time for this action: {elapsed_time:.2f} sec\n")
-
-                    #calcualting evaluation total of all the pieces on the board currently
-                    total_eval = 0
-                    for row in game_state["board"]: 
-                        for piece in row:
-                            if piece == 'wp':
-                                total_eval += 1
-                            elif piece == 'wB' or piece == 'wN':
-                                total_eval += 3
-                            elif piece == 'wQ':
-                                total_eval += 9
-                            elif piece == 'wK':
-                                total_eval += 999
-                            elif piece == 'bp':
-                                total_eval -= 1
-                            elif piece == 'bB' or piece == 'bN':
-                                total_eval -= 3
-                            elif piece == 'bQ':
-                                total_eval -= 9
-                            elif piece == 'bK':
-                                total_eval -= 999
-                    if total_eval is not None:
-                        f.write(f"Heuristic score of resulting board: {total_eval}\n")
-                    if ai_final_score is not None:
-                        f.write(f"Minimax/Alpha-Beta search score: {ai_final_score}\n")
-
-                    # Show new board configuration
-                    f.write("New Board Configuration:\n")
-                    for row_data in game_state["board"]:
-                        f.write(" ".join(row_data) + "\n")
+                    "time": elapsed_time,
+                    # Material total of all the pieces on the board, kept up to date with the bitboards
+                    "eval": self.get_bitboards(game_state)['material'],
+                    "search_score": ai_final_score,
+                }
+
+                # The summary level leaves out the boards and the AI stats
+                if self.trace.level == 'full':
+                    record["board"] = [row_data[:] for row_data in game_state["board"]]
 
                     global mode
                     # Example of AI-specific cumulative info
                     if ((current_player.lower() == self.ai_color) or (current_player.lower() == self.ai_colorH)) and mode in ['2', '3']:
-                        f.write("\nAI Cumulative Info:\n")
-                        # (a) number of states explored
-                        f.write(f" - Cumulative states explored: {self.format_number(self.cumulative_states_explored)}\n")
-
-                        # (b) states by depth (e.g. 1=144, 2=1.1k,...)
-                        states_by_depth_str = ", ".join(
-                            f"{d}={self.format_number(count)}" for d, count in sorted(self.states_explored_by_depth.items())
-                        )
-                        f.write(f" - Cumulative states explored by depth: {states_by_depth_str}\n")
-
-                        # (c) percentages by depth
-                        total_states = float(self.cumulative_states_explored) if self.cumulative_states_explored else 1.0
-                        percents_by_depth_str = ", ".join(
-                            f"{d}={((count / total_states) * 100):.1f}%" for d, count in sorted(self.states_explored_by_depth.items())
-                        )
-                        f.write(f" - Cumulative % states explored by depth: {percents_by_depth_str}\n")
-
-                        # (d) average branching factor
+                        record["states"] = self.cumulative_states_explored
+                        record["states_by_depth"] = dict(self.states_explored_by_depth)
+                        if self.quiescence_nodes:
+                            record["states_by_depth"]["q"] = self.quiescence_nodes
+                        # Average branching factor
                         if self.minimax_calls > 0:
-                            avg_branching = self.total_branching_sum / float(self.minimax_calls)
+                            record["branching"] = self.total_branching_sum / float(self.minimax_calls)
                         else:
-                            avg_branching = 0.0
-                        f.write(f" - Average branching factor: {avg_branching:.1f}\n")
+                            record["branching"] = 0.0
+                        record["cutoff_rate"] = self.first_move_cutoff_rate()
+                        # This move's own search (structured traces only; None for book and table moves)
+                        if self.search_stats is not None:
+                            record["search"] = self.search_stats.to_dict()
+
+                self.trace.write_move(record)
 
             # Update move counters and check for draw
             piece_eliminated = self.check_game_end_conditions(game_state, piece, end_row, end_col)
@@ -301,14 +1373,69 @@ class MiniChess:
 
         return game_state
 
+    def apply_move(self, game_state, move):
+        """
+        Search-only version of make_move. Plays a move that valid_moves produced,
+        in place and without validation or logging, and pushes the captured
+        piece, the promotion flag, the side to move and the running totals on
+        self.undo_stack so undo_move can restore the position exactly.
+        """
+        start, end = move
+        start_row, start_col = start
+        end_row, end_col = end
+        board = game_state["board"]
+        piece = board[start_row][start_col]
+        captured_piece = board[end_row][end_col]
+        bitboards = self.get_bitboards(game_state)
+        totals = (bitboards['hash'], bitboards['material'], bitboards['e1'], bitboards['psq'])
+
+        self.update_bitboards(game_state, piece, start, end, captured_piece)
+        board[start_row][start_col] = '.'
+        board[end_row][end_col] = piece
+
+        # Only the pawn that just moved can have reached its last rank
+        promoted = piece[1] == 'p' and end_row == (0 if piece[0] == 'w' else 4)
+        if promoted:
+            self.handle_pawn_promotion(game_state)
+
+        self.undo_stack.append((move, piece, captured_piece, promoted, game_state["turn"], totals))
+        game_state["turn"] = "black" if game_state["turn"] == "white" else "white"
+
+    def undo_move(self, game_state):
+        """Takes back the last move played with apply_move."""
+        move, piece, captured_piece, promoted, turn, totals = self.undo_stack.pop()
+        start, end = move
+        board = game_state["board"]
+        bitboards = self.get_bitboards(game_state)
+
+        if promoted:
+            # Turn the queen back into the pawn before moving it home
+            queen = piece[0] + 'Q'
+            end_bit = SQUARE_BITS[end[0] * 5 + end[1]]
+            bitboards[queen] ^= end_bit
+            bitboards[piece] |= end_bit
+
+        self.update_bitboards(game_state, piece, end, start, '.')
+        if captured_piece != '.':
+            end_bit = SQUARE_BITS[end[0] * 5 + end[1]]
+            bitboards[captured_piece] |= end_bit
+            bitboards[captured_piece[0]] |= end_bit
+        board[start[0]][start[1]] = piece
+        board[end[0]][end[1]] = captured_piece
+        bitboards['hash'], bitboards['material'], bitboards['e1'], bitboards['psq'] = totals
+        game_state["turn"] = turn
+
     def handle_pawn_promotion(self, game_state):
         pawn_to_queen = False
+        bitboards = self.get_bitboards(game_state)
         for col in range(5):
             if game_state["board"][0][col] == 'wp':
                 game_state["board"][0][col] = 'wQ'
+                self.promote_in_bitboards(bitboards, 'wp', col)
                 pawn_to_queen = True
             elif game_state["board"][4][col] == 'bp':
                 game_state["board"][4][col] = 'bQ'
+                self.promote_in_bitboards(bitboards, 'bp', 20 + col)
                 pawn_to_queen = True
         return pawn_to_queen
 
@@ -333,31 +1460,23 @@ class MiniChess:
     
     def end_game(self, message, log_message):
         """
-        Called when the game ends (king gone or draw).
-        Writes final result in trace_file_name with last move info & winner.
+        Called when the game ends (king gone, no moves left or max turns).
+        Writes final result in trace_file_name with last move info & winner,
+        and records log_message in self.game_result so the game loop stops.
         """
-        if self.trace_file_name:
-            with open(self.trace_file_name, "a") as f:
-                if self.last_move_info:
-                    winner, turn_num, last_move = self.last_move_info
-                    start, end = last_move
-                    start_col_letter = chr(ord('A') + start[1])
-                    end_col_letter = chr(ord('A') + end[1])
-                    start_row_num = str(5 - start[0])
-                    end_row_num = str(5 - end[0])
-                    final_move_str = f"({start_col_letter}{start_row_num} -> {end_col_letter}{end_row_num})"
-                    f.write(
-                        f"\n=== GAME OVER ===\n"
-                        f"Final result: {log_message}\n"
-                        f"Decision move: {final_move_str}\n"
-                        f"Occurred at turn #{turn_num}\n"
-                    )
-                else:
-                    # Fallback if no last_move_info
-                    f.write(f"\n=== GAME OVER ===\nFinal result: {log_message}\n")
-
-        print(message)
-        sys.exit(0)
+        if self.trace:
+            record = {"result": log_message, "player": None, "turn": None, "from": None, "to": None}
+            if self.last_move_info:
+                winner, turn_num, last_move = self.last_move_info
+                start, end = last_move
+                record.update(player=winner, turn=turn_num,
+                              **{"from": f"{chr(ord('A') + start[1])}{5 - start[0]}",
+                                 "to": f"{chr(ord('A') + end[1])}{5 - end[0]}"})
+            self.trace.write_result(record)
+
+        if self.verbose:
+            print(message)
+        self.game_result = log_message
 
     def update_move_counters(self, captured_piece):
         global WhiteMoveCounter
@@ -374,15 +1493,16 @@ class MiniChess:
             BlackMoveCounter += 1
 
     def check_for_draw(self):
-        if self.move_counter >= 10:
-            if self.trace_file_name:
-                with open(self.trace_file_name, "a") as f:
-                    f.write("\n=== GAME OVER ===\nResult: DRAW\n")
-                    if self.last_move_info:
-                        player, turn_num, last_move = self.last_move_info
-                        f.write(f"Draw occurred after {player}'s turn at turn #{turn_num}\n")
-            print("No one won... It's a draw!")
-            sys.exit(0)
+        if self.move_counter >= 10 and self.game_result is None:
+            if self.trace:
+                record = {"result": "DRAW", "player": None, "turn": None}
+                if self.last_move_info:
+                    player, turn_num, last_move = self.last_move_info
+                    record.update(player=player, turn=turn_num)
+                self.trace.write_result(record)
+            if self.verbose:
+                print("No one won... It's a draw!")
+            self.game_result = "DRAW"
 
     def captured_piece(self, game_state, end):
         end_row, end_col = end
@@ -412,41 +1532,94 @@ class MiniChess:
 
         return white_king and black_king
 
+    def is_square_attacked(self, game_state, sq, by_color):
+        """
+        True if a piece of color by_color ('w' or 'b') could move onto square sq
+        (index row * 5 + col). Looks outward from sq with the attack tables
+        instead of generating the attacker's moves.
+        """
+        bitboards = self.get_bitboards(game_state)
+        if KNIGHT_ATTACKS[sq] & bitboards[by_color + 'N'] or KING_ATTACKS[sq] & bitboards[by_color + 'K']:
+            return True
+        # A pawn attacks sq from the squares a pawn of the other color would capture on
+        if PAWN_ATTACKS['b' if by_color == 'w' else 'w'][sq] & bitboards[by_color + 'p']:
+            return True
+
+        queens = bitboards[by_color + 'Q']
+        bishops = bitboards[by_color + 'B']
+        if not (QUEEN_RAY_MASKS[sq] & (queens | bishops)):
+            return False
+        occupied = bitboards['w'] | bitboards['b']
+        for ray, diagonal in ATTACK_RAYS[sq]:
+            sliders = queens | bishops if diagonal else queens
+            for bit in ray:
+                if bit & occupied:
+                    if bit & sliders:
+                        return True
+                    break
+        return False
+
     def is_king_in_danger(self, game_state, king_color):
         """
         Determines if a king of the given color can be captured by the opponent 
         in their very next move. This is used to give priority to moves that save the king.
         """
-        king_positions = []
-        # Look for the positions of the king whose color is king_color
-        for r in range(5):
-            for c in range(5):
-                piece = game_state["board"][r][c]
-                if piece != '.' and piece[0] == king_color and piece[1] == 'K':
-                    king_positions.append((r, c))
+        king = self.get_bitboards(game_state)[king_color + 'K']
 
         # If we can't find such a king, we assume it's 'in danger' by default, 
         # because there's effectively no king left
-        if not king_positions:
+        if not king:
             return True
 
-        # Temporarily switch the turn to the opponent to find their valid moves
-        original_turn = game_state["turn"]
-        game_state["turn"] = "white" if original_turn == "black" else "black"
+        return self.is_square_attacked(game_state, king.bit_length() - 1, 'b' if king_color == 'w' else 'w')
 
-        opponent_moves = self.valid_moves(game_state)
+    def classify_moves(self, game_state, moves, king_color):
+        """
+        Plays each move once and sorts it into:
+          - safe: our king cannot be captured afterwards
+          - risky: our king can be captured afterwards
+          - king_captures: takes the opponent's king without leaving ours en prise
+        """
+        safe_moves, risky_moves, king_capture_moves = [], [], []
+        opponent_king = self.get_bitboards(game_state)[('b' if king_color == 'w' else 'w') + 'K']
+        for move in moves:
+            self.apply_move(game_state, move)
+            in_danger = self.is_king_in_danger(game_state, king_color)
+            self.undo_move(game_state)
+            if in_danger:
+                risky_moves.append(move)
+            else:
+                safe_moves.append(move)
+                if SQUARE_BITS[move[1][0] * 5 + move[1][1]] & opponent_king:
+                    king_capture_moves.append(move)
+        return safe_moves, risky_moves, king_capture_moves
 
-        # Restore the original turn
-        game_state["turn"] = original_turn
 
-        # If any of the opponent's moves could end on the king's position, the king is in danger
-        king_set = set(king_positions)
-        for om in opponent_moves:
-            _, end_pos = om
-            if end_pos in king_set:
-                return True
-        return False
+    def parse_position(self, text):
+        """
+        Builds a game state from a one-line position: the five rows from the top
+        separated by '/', squares separated by spaces, then 'w' or 'b' for the
+        side to move, e.g. "bK bQ bB bN ./. . bp bp ./. . . . ./. wp wp . ./. wN wB wQ wK w".
+        """
+        rows = [row.split() for row in text.strip().split('/')]
+        turn = rows[-1].pop()
+        if len(rows) != 5 or any(len(row) != 5 for row in rows) or turn not in ('w', 'b'):
+            raise ValueError(f"Not a MiniChess position: {text!r}")
+        for row in rows:
+            for piece in row:
+                if piece != '.' and piece not in PIECE_NAMES:
+                    raise ValueError(f"Unknown piece {piece!r} in position {text!r}")
+        return {"board": rows, "turn": 'white' if turn == 'w' else 'black'}
 
+    def format_position(self, game_state):
+        """The one-line form of game_state read by parse_position."""
+        rows = '/'.join(' '.join(row) for row in game_state["board"])
+        return f"{rows} {game_state['turn'][0]}"
+
+    def format_move(self, move):
+        """Writes a move in the same coordinates parse_input reads, e.g. 'B2 B3'."""
+        (start_row, start_col), (end_row, end_col) = move
+        return f"{chr(ord('A') + start_col)}{5 - start_row} {chr(ord('A') + end_col)}{5 - end_row}"
 
     def parse_input(self, move):
         try:
@@ -465,144 +1638,274 @@ class MiniChess:
               "\n2. Player vs AI"
               "\n3. AI vs AI")
 
-        global mode, algorithm, player1_color, TIME_LIMIT, max_turns, chosen_heuristic, chosen_heuristic_1, chosen_heuristic_2
-
-        mode = input("Enter the mode number: ")
-        if mode == '1':
+        game_mode = input("Enter the mode number: ")
+        if game_mode == '1':
             print("Player vs Player mode selected.")
-        elif mode == '2':
+        elif game_mode == '2':
             print("Player vs AI mode selected.")
-        elif mode == '3':
+        elif game_mode == '3':
             print("AI vs AI mode selected.")
         else:
             print("Invalid mode. Exiting game.")
             exit(1)
 
-        if mode == '2' or mode == '3':
+        # Player vs Player keeps the module defaults for the AI settings
+        color, search, time_limit, turns = player1_color, algorithm, TIME_LIMIT, max_turns
+        heuristic_1, heuristic_2 = chosen_heuristic_1, chosen_heuristic_2
+        if game_mode == '2' or game_mode == '3':
             print("Which color should player 1 be? (w/b): ")
-            player1_color = input().strip().lower()
-            if player1_color == 'w':
+            color = input().strip().lower()
+            if color == 'w':
                 print("Player 1 is white and starts first.")
-                self.current_game_state["turn"] = 'white'
-                self.ai_color = "black"  
-                self.ai_colorH = "white"
-            elif player1_color == 'b':
+            elif color == 'b':
                 print("Player 1 is black and starts second (after first AI).")
-                self.current_game_state["turn"] = 'white'
-                self.ai_color = "white"
-                self.ai_colorH = "black"  
             else:
                 print("Invalid color. Exiting game.")
                 exit(1)
 
             print("Do you want minimax or alpha-beta pruning? (m/a): ")
-            algorithm = input().strip().lower()
-            if algorithm not in ['m', 'a']:
+            search = input().strip().lower()
+            if search not in ['m', 'a']:
                 print("Invalid algorithm. Exiting game.")
                 exit(1)
 
             print("Select timeout time for the AI: ")
-            TIME_LIMIT = int(input().strip())
+            time_limit = int(input().strip())
 
             print("Select max number of turns (in total): ")
-            max_turns = int(input().strip())
+            turns = int(input().strip())
 
-            print(f"Choose a heuristic between e0, e1, e2, e3, e4 for AI {self.ai_color}:")
-            chosen_heuristic_1 = input().strip().lower()
-            if chosen_heuristic_1 not in ['e0', 'e1', 'e2', 'e3', 'e4']:
+            print(f"Choose a heuristic between e0, e1, e2, e3, e4 for AI {'black' if color == 'w' else 'white'}:")
+            heuristic_1 = input().strip().lower()
+            if heuristic_1 not in HEURISTICS:
                 print("Invalid heuristic. Exiting game.")
                 exit(1)
-            if mode == '3':
-                print(f"Chose a heuristic for the second AI {self.ai_colorH}: ")
-                chosen_heuristic_2 = input().strip().lower()
-                if chosen_heuristic_2 not in ['e0', 'e1', 'e2', 'e3', 'e4']:
+            if game_mode == '3':
+                print(f"Chose a heuristic for the second AI {'white' if color == 'w' else 'black'}: ")
+                heuristic_2 = input().strip().lower()
+                if heuristic_2 not in HEURISTICS:
                     print("Invalid heuristic. Exiting game.")
                     exit(1)
 
         print("Enter 'exit' to quit the game.")
 
+        self.configure(game_mode, color, search, time_limit, turns, heuristic_1, heuristic_2)
+        return self.run_game()
+
+    def configure(self, game_mode, color, search, time_limit, turns, heuristic_1='e0', heuristic_2='e0'):
+        """
+        Sets the game options that play() asks for: mode '1'/'2'/'3', player 1's
+        color 'w'/'b', algorithm 'm'/'a', AI time limit in seconds, max turns and
+        the heuristics of the first AI (self.ai_color) and second AI (self.ai_colorH).
+        """
+        global mode, algorithm, player1_color, TIME_LIMIT, max_turns, chosen_heuristic_1, chosen_heuristic_2
+        mode, player1_color, algorithm, TIME_LIMIT, max_turns = game_mode, color, search, time_limit, turns
+        chosen_heuristic_1, chosen_heuristic_2 = heuristic_1, heuristic_2
+        self.heuristic_name = heuristic_1
+
+        if mode == '1':
+            self.ai_color = None
+            self.ai_colorH = None
+        elif player1_color == 'w':
+            self.ai_color = "black"
+            self.ai_colorH = "white"
+        else:
+            self.ai_color = "white"
+            self.ai_colorH = "black"
+
+    def new_game(self):
+        """Puts the board, counters and search tables back to the start of a game."""
+        global NumOfMoves, WhiteMoveCounter, BlackMoveCounter
+        NumOfMoves = 0
+        WhiteMoveCounter = 1
+        BlackMoveCounter = 1
+
+        self.current_game_state = self.init_board()
+        self.move_counter = 0
+        self.last_move_info = None
+        self.game_result = None
+        self.undo_stack = []
+        self.principal_variation = []
+        if HASH_FILE is None:
+            self.transposition_table.clear()
+        else:
+            self.open_hash_file()
+        self.cumulative_states_explored = 0
+        self.states_explored_by_depth = {}
+        self.total_branching_sum = 0
+        self.minimax_calls = 0
+        self.history_table = [[0] * 625, [0] * 625]
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.quiescence_nodes = 0
+        self.pvs_researches = 0
+        self.aspiration_researches = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.search_stats = None
+
+    def run_game(self, trace_level=None, game_number=None):
+        """
+        Plays one game from the start position with the options set by configure()
+        and returns the final result ("WHITE WINS", "BLACK WINS", "DRAW",
+        "MAX TURNS", or "EXITED" when a human types 'exit'). Can be called again
+        for another game on the same MiniChess. trace_level is 'off', 'summary'
+        or 'full' (default TRACE_LEVEL). game_number, when given, is added to the
+        trace file name so that each game of a series keeps its own trace.
+        """
+        self.new_game()
+        trace_level = trace_level or TRACE_LEVEL
+
         # Determine the flag for alpha-beta
         alpha_beta_on = (algorithm == 'a')
         # Build the trace file name
-        self.trace_file_name = f"gameTrace-{str(alpha_beta_on).lower()}-{TIME_LIMIT}-{max_turns}.txt"
+        base_name = f"gameTrace-{str(alpha_beta_on).lower()}-{TIME_LIMIT}-{max_turns}"
+        if game_number is not None:
+            base_name += f"-{game_number}"
+        if TRACE_FORMAT == 'jsonl':
+            self.trace_file_name = base_name + ".jsonl"
+            writer = JsonlTraceWriter
+        else:
+            self.trace_file_name = base_name + ".txt"
+            writer = TraceWriter
+        self.trace = writer(self.trace_file_name, trace_level, TRACE_BACKGROUND) if trace_level != 'off' else None
 
         player1_name = "White" if player1_color == 'w' else "Black"
 
         # Write initial game parameters to trace file
-        with open(self.trace_file_name, "w") as f:
-            f.write(f"Game Parameters:\n")
-            f.write(f" - Timeout (t): {TIME_LIMIT}\n")
-            f.write(f" - Max Turns (m): {max_turns}\n")
-            f.write(f" - Player 1 color: {player1_name.upper()}\n")
+        if self.trace:
             if mode == '2':
                 if player1_color == 'w':
-                    f.write(" - Player 1 = Human & Player 2 = AI\n")
+                    players = "Player 1 = Human & Player 2 = AI"
                 else:
-                    f.write(" - Player 1 = AI & Player 2 = Human\n")
+                    players = "Player 1 = AI & Player 2 = Human"
             elif mode == '3':
-                f.write(" - Player 1 = AI & Player 2 = AI\n")
+                players = "Player 1 = AI & Player 2 = AI"
             else:
-                f.write(" - Player 1 = Human & Player 2 = Human\n")
-            f.write(f" - Alpha-Beta: {alpha_beta_on}\n")
-            # Example: using a placeholder for your heuristic name
-            if mode in ['2', '3'] and hasattr(self, "heuristic_name"):
-                f.write(f" - AI (one) Heuristic: {chosen_heuristic_1}\n")
+                players = "Player 1 = Human & Player 2 = Human"
+            heuristics = []
+            if mode in ['2', '3'] and self.heuristic_name:
+                heuristics.append(chosen_heuristic_1)
                 if mode == '3':
-                    f.write(f" - AI (two) Heuristic: {chosen_heuristic_2}\n")
-            f.write("\nInitial Board Configuration:\n")
-            for row in self.current_game_state["board"]:
-                f.write(" ".join(row) + "\n")
-
-        while True:
+                    heuristics.append(chosen_heuristic_2)
+            self.trace.write_header({
+                "timeout": TIME_LIMIT,
+                "max_turns": max_turns,
+                "player1_color": player1_name.upper(),
+                "players": players,
+                "alpha_beta": alpha_beta_on,
+                "heuristics": heuristics,
+                "board": [row[:] for row in self.current_game_state["board"]],
+            })
+
+        # Whatever stops the game (end, exit, Ctrl+C), stop pondering and write out what is buffered
+        try:
+            self.play_turns()
+        finally:
+            self.finish_pondering(None)
+            if self.trace:
+                self.trace.close()
+                self.trace = None
+            if self.search_stats_file is not None:
+                self.search_stats_file.close()
+                self.search_stats_file = None
+        if HASH_FILE is not None and self.ai_color is not None:
+            self.transposition_table.save(HASH_FILE, self.ai_color)
+        return self.game_result
+
+    def open_hash_file(self):
+        """
+        Once per MiniChess, swaps in the transposition table saved in HASH_FILE
+        by an earlier run, when there is one of the same size whose scores are
+        from this AI's side. Otherwise the table already in use is kept.
+        """
+        if self.hash_file_opened or self.ai_color is None:
+            return
+        self.hash_file_opened = True
+        loaded = TranspositionTable.load(HASH_FILE)
+        if loaded is None:
+            return
+        table, side = loaded
+        if side != self.ai_color or len(table.buffer) != len(self.transposition_table.buffer):
+            table.release()
+            return
+        if self.search_memory is not None:
+            # Helpers already share the table in memory: copy the saved one into it
+            self.transposition_table.buffer[:] = table.buffer
+            self.transposition_table.generation = table.generation
+            table.release()
+            return
+        self.transposition_table.release()
+        self.transposition_table = table
+
+    def play_turns(self):
+        """Runs the game loop of run_game until self.game_result is set."""
+        global chosen_heuristic, NumOfMoves
+        while self.game_result is None:
             # Display the current state of the board each time before a move
-            self.display_board(self.current_game_state)
+            if self.verbose:
+                self.display_board(self.current_game_state)
 
             if mode == '3':
                 # In 'AI vs AI' mode, both sides are controlled by the AI
-                print(f"AI ({self.current_game_state['turn']}) is thinking...")
+                if self.verbose:
+                    print(f"AI ({self.current_game_state['turn']}) is thinking...")
                 start_time = time.time()
 
-                # Determine if AI should play as the "maximizing" side
-                # Typically, white is considered the maximizing player
-                ai_is_white = (self.current_game_state['turn'] == 'white')
-                
+                # The evaluate_board_* functions score positions from self.ai_color's side,
+                # so that AI maximizes and the other one minimizes the same score
+                ai_is_maximizing = (self.current_game_state['turn'] == self.ai_color)
+
                 if (self.current_game_state['turn'] == self.ai_color):
                     chosen_heuristic = chosen_heuristic_1
                 else:
                     chosen_heuristic = chosen_heuristic_2
 
                 # Use the minimax (or alpha-beta) approach to find the best move
-                best_eval, move = self.use_minimax(self.current_game_state, alpha=-math.inf, beta=math.inf, maximizing_player=ai_is_white, start_time=start_time)
+                best_eval, move = self.use_minimax(self.current_game_state, alpha=-math.inf, beta=math.inf, maximizing_player=ai_is_maximizing, start_time=start_time)
 
                 # If the AI has no valid moves, it loses
                 if move is None:
-                    print(f"AI ({self.current_game_state['turn']}) has no valid moves. It loses!")
-                    exit(1)
+                    self.end_game(f"AI ({self.current_game_state['turn']}) has no valid moves. It loses!",
+                                  "BLACK WINS" if self.current_game_state['turn'] == "white" else "WHITE WINS")
+                    break
 
-                print(f"AI ({self.current_game_state['turn']}) move: {move}")
+                if self.verbose:
+                    print(f"AI ({self.current_game_state['turn']}) move: {move}")
                 # Apply the chosen move to the current game state
                 elapsed_time = time.time() - start_time
                 self.current_game_state = self.make_move(self.current_game_state, move, simulation=False, elapsed_time=elapsed_time, ai_eval_score=best_eval, ai_final_score=best_eval)
 
             elif self.current_game_state['turn'] == self.ai_color:
                 # If we are in 'Player vs AI' mode and it's AI's turn
-                print("AI is thinking...")
-                
+                if self.verbose:
+                    print("AI is thinking...")
+
                 chosen_heuristic = chosen_heuristic_1
 
                 start_time = time.time()
 
-                # Determine if the AI is maximizing (if it is playing as white)
-                best_eval, move = self.use_minimax(self.current_game_state, alpha=-math.inf, beta=math.inf, maximizing_player=(self.ai_color == 'white'), start_time=start_time)
+                # The evaluations are scored from the AI's side, so it is always maximizing.
+                # If the human played the reply we pondered on, that search already has the answer.
+                pondered = self.finish_pondering(self.current_game_state)
+                if pondered is not None:
+                    best_eval, move = pondered
+                else:
+                    best_eval, move = self.use_minimax(self.current_game_state, alpha=-math.inf, beta=math.inf, maximizing_player=True, start_time=start_time)
 
                 if move is None:
-                    print(f"AI ({self.ai_color}) has no valid moves. It loses!")
-                    exit(1)
+                    self.end_game(f"AI ({self.ai_color}) has no valid moves. It loses!",
+                                  "BLACK WINS" if self.ai_color == "white" else "WHITE WINS")
+                    break
 
-                print(f"AI ({self.ai_color}) move: {move}")
+                if self.verbose:
+                    print(f"AI ({self.ai_color}) move: {move}")
                 # Apply the AI's chosen move
                 elapsed_time = time.time() - start_time
                 self.current_game_state = self.make_move(self.current_game_state, move, simulation=False, elapsed_time=elapsed_time, ai_eval_score=best_eval, ai_final_score=best_eval)
+                if PONDER and self.game_result is None:
+                    self.start_pondering(self.current_game_state)
 
             else:
                 # If it's not AI vs AI and not AI's turn, then it's a human player's turn
@@ -610,7 +1913,8 @@ class MiniChess:
                 if move.lower() == 'exit':
                     # Allow the player to exit the game
                     print("Game exited.")
-                    exit(1)
+                    self.game_result = "EXITED"
+                    break
 
                 # Convert the player's textual input (e.g., "a2 b3") into board coordinates
                 move = self.parse_input(move)
@@ -624,57 +1928,402 @@ class MiniChess:
                 self.current_game_state = self.make_move(self.current_game_state, move, simulation=False)
 
             # For modes involving an AI (either 'Player vs AI' or 'AI vs AI'), track the number of moves
-            if mode == '2' or mode == '3':
-                global NumOfMoves
+            if (mode == '2' or mode == '3') and self.game_result is None:
                 # If the number of moves has reached the maximum limit, end the game
                 if NumOfMoves > max_turns and WhiteMoveCounter == BlackMoveCounter and WhiteMoveCounter > max_turns and BlackMoveCounter > max_turns:
-                    print("Max number of turns reached. Exiting game.")
-                    exit(1)
+                    self.end_game("Max number of turns reached. Exiting game.", "MAX TURNS")
+                    break
                 NumOfMoves += 1
 
     def use_minimax(self, game_state, alpha, beta, maximizing_player, start_time):
         """
-        Initiates a minimax (or alpha-beta if chosen) search to find the best move 
-        for the current player. We iteratively deepen up to depth 50 or until the time limit expires.
+        Initiates a minimax (or alpha-beta if chosen) search to find the best move
+        for the current player. We iteratively deepen, one ply at a time, until the
+        time limit expires. Each iteration searches the previous principal
+        variation first, and an iteration the clock cuts short is thrown away in
+        favour of the last one that completed (the first one always completes).
+        With SEARCH_WORKERS > 1 helper processes search the same position at the
+        same time (see use_parallel_minimax).
         """
+        self.search_stats = None
+        book_result = self.probe_opening_book(game_state)
+        if book_result is not None:
+            return book_result
+        tablebase_result = self.probe_tablebase_root(game_state)
+        if tablebase_result is not None:
+            return tablebase_result
+        if SEARCH_WORKERS > 1:
+            result = self.use_parallel_minimax(game_state, alpha, beta, maximizing_player, start_time)
+        else:
+            result = self.iterative_deepening(game_state, alpha, beta, maximizing_player, start_time)
+        self.write_search_stats()
+        return result
+
+    def probe_opening_book(self, game_state):
+        """
+        Returns (score, move) from the opening book for this position and
+        chosen_heuristic, with the score from self.ai_color's side like a search
+        result, or None if the book has no entry (or there is no book).
+        """
+        if not USE_OPENING_BOOK:
+            return None
+        if self.opening_book is None:
+            if self.opening_book_missing or not os.path.exists(OPENING_BOOK_FILE):
+                self.opening_book_missing = True
+                return None
+            self.opening_book = OpeningBook(OPENING_BOOK_FILE)
+
+        entry = self.opening_book.probe(self.get_hash(game_state) ^ ZOBRIST_HEURISTICS.get(chosen_heuristic, 0))
+        # A hash collision could name a move that is not legal here
+        if entry is None or entry[2] not in self.valid_moves(game_state):
+            return None
+        score, depth, move = entry
+        self.completed_depth = depth
+        return (score if game_state["turn"] == self.ai_color else -score), move
+
+    def load_tablebase(self):
+        """Opens the endgame tables in TABLEBASE_DIR once, leaving self.tablebase None if there are none."""
+        if not self.tablebase_loaded:
+            self.tablebase_loaded = True
+            tablebase = Tablebase(TABLEBASE_DIR) if USE_TABLEBASE else None
+            self.tablebase = tablebase if tablebase is not None and tablebase.max_pieces else None
+        return self.tablebase
+
+    def tablebase_score(self, value, turn):
+        """Turns a table value for the side to move into a search score from self.ai_color's side."""
+        if value > 0:
+            score = TABLEBASE_WIN - value
+        elif value < 0:
+            score = -(TABLEBASE_WIN + value)
+        else:
+            score = 0
+        return score if turn == self.ai_color else -score
+
+    def probe_tablebase_root(self, game_state):
+        """
+        When the endgame tables cover every move from this position, returns
+        (score, move) for the move with the best table result: the fastest win,
+        else a draw, else the slowest loss. Otherwise returns None.
+        """
+        tablebase = self.load_tablebase()
+        bitboards = self.get_bitboards(game_state)
+        if tablebase is None or not bitboards['wK'] or not bitboards['bK']:
+            return None
+        if tablebase.probe(bitboards, game_state["turn"]) is None:
+            return None
+
+        best_rank, best_value, best_move = None, None, None
+        for move in self.valid_moves(game_state):
+            (end_row, end_col) = move[1]
+            if game_state["board"][end_row][end_col][1:] == 'K':
+                value = 1  # the king is captured right away
+            else:
+                self.apply_move(game_state, move)
+                child_value = tablebase.probe(bitboards, game_state["turn"])
+                self.undo_move(game_state)
+                if child_value is None:
+                    return None
+                # The child's value is from the opponent's side, one ply later
+                if child_value < 0:
+                    value = -child_value + 1
+                elif child_value > 0:
+                    value = -(child_value + 1)
+                else:
+                    value = 0
+            rank = (2, -value) if value > 0 else (1, 0) if value == 0 else (0, -value)
+            if best_rank is None or rank > best_rank:
+                best_rank, best_value, best_move = rank, value, move
+
+        if best_move is None:
+            return None
+        return self.tablebase_score(best_value, game_state["turn"]), best_move
+
+    def iterative_deepening(self, game_state, alpha, beta, maximizing_player, start_time, first_depth=1):
         global chosen_heuristic
 
+        self.load_tablebase()
+        self.transposition_table.new_search()
+        # Killers are per search; history carries over at half weight
+        self.killer_moves = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        for side_history in self.history_table:
+            for index in range(len(side_history)):
+                side_history[index] //= 2
         best_move = None
         # Assume the best evaluation starts at negative infinity for maximizing, or positive infinity for minimizing
         best_eval = -math.inf if maximizing_player else math.inf
-        depth = 1
-
-        # We'll increment depth by 1, but we often break sooner if the time limit is reached
-        while depth <= 2:
+        self.principal_variation = []
+        self.completed_depth = 0
+        depth = first_depth
+        self.search_stats = SearchStats(self.search_counters(), chosen_heuristic, algorithm, game_state["turn"])
+
+        while depth <= MAX_SEARCH_DEPTH:
+            self.root_depth = depth
+            self.search_aborted = False
+
+            # Aspiration: search a window around the previous score first, widening the side
+            # it fails on, since a narrow window prunes more
+            window = ASPIRATION_WINDOW
+            use_window = algorithm == 'a' and self.completed_depth > 0 and abs(best_eval) < TABLEBASE_WIN - MAX_SEARCH_DEPTH
+            low = max(alpha, best_eval - window) if use_window else alpha
+            high = min(beta, best_eval + window) if use_window else beta
+            while True:
+                self.follow_pv = True
+                current_eval, current_move = self.minimax(game_state, depth, low, high, maximizing_player, start_time)
+                if self.search_aborted:
+                    break
+                window *= 2
+                if current_eval <= low and low > alpha:
+                    low = max(alpha, best_eval - window) if window < TABLEBASE_WIN else alpha
+                elif current_eval >= high and high < beta:
+                    high = min(beta, best_eval + window) if window < TABLEBASE_WIN else beta
+                else:
+                    break
+                self.aspiration_researches += 1
 
-            current_eval, current_move = self.minimax(game_state, depth, alpha, beta, maximizing_player, start_time)
+            self.search_stats.add_iteration(depth, self.search_counters(), not self.search_aborted)
+            if self.search_aborted:
+                break
 
-            # If we found a move at this depth, update the best found so far
+            # The iteration completed: keep its result and its line for the next one
             if current_move is not None:
                 best_eval = current_eval
                 best_move = current_move
+            self.completed_depth = depth
+            self.principal_variation = self.extract_pv(game_state, depth)
+            if self.on_iteration is not None:
+                self.on_iteration(depth, best_eval, self.principal_variation)
 
             # If our allotted time limit is exceeded, we stop searching deeper
-            if (time.time() - start_time) >= TIME_LIMIT:
+            if not self.pondering and (time.time() - start_time) >= TIME_LIMIT:
                 break
 
             depth += 1
 
+        self.follow_pv = False
+        self.search_stats.finish(self.search_counters(), self.completed_depth, best_eval,
+                                 self.format_move(best_move) if best_move is not None else None)
         return best_eval, best_move
 
-    def minimax(self, game_state, depth, alpha, beta, maximizing_player, start_time):
+    def search_counters(self):
+        """The running search counters, by their SearchStats names."""
+        return {
+            "nodes": self.cumulative_states_explored,
+            "quiescence_nodes": self.quiescence_nodes,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_cutoffs": self.tt_cutoffs,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "pvs_researches": self.pvs_researches,
+            "aspiration_researches": self.aspiration_researches,
+        }
+
+    def write_search_stats(self):
+        """Appends the last search's statistics to SEARCH_STATS_FILE as one JSON line."""
+        if SEARCH_STATS_FILE is None or self.search_stats is None or self.stop_search:
+            return  # a cancelled pondering search has nothing to report
+        if self.search_stats_file is None:
+            # Line buffered, so every search is on disk as soon as it is written
+            self.search_stats_file = open(SEARCH_STATS_FILE, "a", buffering=1)
+        self.search_stats_file.write(self.search_stats.to_json() + "\n")
+
+    def use_parallel_minimax(self, game_state, alpha, beta, maximizing_player, start_time):
+        """
+        Lazy SMP: SEARCH_WORKERS - 1 helper processes and this one run the same
+        iterative deepening on the same position, sharing one transposition
+        table in shared memory. Helpers start at staggered depths so they fill
+        the table ahead of the main search. The deepest completed result wins;
+        on a tie the main search's result is kept.
+        """
+        self.start_search_workers(SEARCH_WORKERS - 1)
+        self.search_job_id += 1
+        job = {
+            "job_id": self.search_job_id,
+            # A compact copy: the queue pickles in the background while this process searches in place
+            "position": Position.from_state(game_state),
+            "alpha": alpha,
+            "beta": beta,
+            "maximizing_player": maximizing_player,
+            "start_time": start_time,
+            "time_limit": TIME_LIMIT,
+            "algorithm": algorithm,
+            "heuristic": chosen_heuristic,
+            # The remaining search options too: a spawned helper starts from the module defaults
+            "max_depth": MAX_SEARCH_DEPTH,
+            "quiescence_depth": QUIESCENCE_DEPTH,
+            "batch_eval": BATCH_EVAL,
+            "use_tablebase": USE_TABLEBASE,
+            "tablebase_dir": TABLEBASE_DIR,
+            "time_margin": TIME_MARGIN,
+            "ai_color": self.ai_color,
+            # The generation this search is about to start from, so all processes age entries alike
+            "generation": self.transposition_table.generation,
+        }
+        for jobs in self.search_worker_queues:
+            jobs.put(job)
+
+        best_eval, best_move = self.iterative_deepening(game_state, alpha, beta, maximizing_player, start_time)
+        best_depth = self.completed_depth
+
+        # Helpers stop on the same clock; allow a little slack for them to report
+        deadline = time.time() + 1.0
+        pending = len(self.search_worker_queues)
+        while pending:
+            try:
+                job_id, depth, helper_eval, helper_move = self.search_results.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if job_id != self.search_job_id:
+                continue  # a late answer to an earlier move
+            pending -= 1
+            if helper_move is not None and depth > best_depth:
+                best_depth, best_eval, best_move = depth, helper_eval, helper_move
+        return best_eval, best_move
+
+    def start_search_workers(self, count):
+        """
+        Starts the helper processes once and moves the transposition table
+        (with what it holds) into shared memory so all of them probe and store
+        into the same table.
+        """
+        if self.search_worker_queues:
+            return
+        table = self.transposition_table
+        self.search_memory = shared_memory.SharedMemory(create=True, size=len(table.buffer))
+        self.search_memory.buf[:len(table.buffer)] = table.buffer
+        self.transposition_table = TranspositionTable(buffer=self.search_memory.buf)
+        self.transposition_table.generation = table.generation
+        table.release()
+        self.search_results = multiprocessing.Queue()
+        for worker_id in range(1, count + 1):
+            jobs = multiprocessing.Queue()
+            process = multiprocessing.Process(target=search_worker, daemon=True,
+                                              args=(worker_id, self.search_memory.name, jobs, self.search_results))
+            process.start()
+            self.search_worker_queues.append(jobs)
+            self.search_processes.append(process)
+        atexit.register(self.stop_search_workers)
+
+    def stop_search_workers(self):
+        """Stops the helper processes and frees the shared transposition table."""
+        if not self.search_worker_queues:
+            return
+        for jobs in self.search_worker_queues:
+            jobs.put(None)
+        for process in self.search_processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.search_worker_queues = []
+        self.search_processes = []
+        self.transposition_table.release()
+        self.transposition_table = TranspositionTable(TT_SIZE_MB)
+        self.search_memory.close()
+        self.search_memory.unlink()
+        self.search_memory = None
+
+    def time_is_up(self, start_time, margin=0.0):
+        """
+        True once TIME_LIMIT (less margin) has passed. The first iteration is never
+        stopped, so use_minimax always has a complete result to fall back on.
+        A pondering search has no time limit until finish_pondering, and a
+        cancelled one stops at once. Reaching node_limit counts as running out
+        of time.
+        """
+        if self.stop_search:
+            return True
+        if self.pondering:
+            return False
+        return self.root_depth > 1 and ((time.time() - start_time) >= TIME_LIMIT - margin
+                                        or self.cumulative_states_explored >= self.node_limit)
+
+    def start_pondering(self, game_state):
+        """
+        Called after the AI's move in Player vs AI mode: guesses the human's
+        reply (the best move the search stored for game_state) and searches the
+        position after it in a background thread while the human thinks. The
+        search shares the transposition table and runs without a time limit
+        until finish_pondering. input() releases the interpreter lock, so the
+        thread has the processor to itself.
+        """
+        entry = self.transposition_table.probe(self.get_hash(game_state) ^ ZOBRIST_HEURISTICS.get(chosen_heuristic, 0))
+        guess = entry[3] if entry is not None else None
+        if guess is None or guess not in self.valid_moves(game_state):
+            return
+        position = Position.from_state(game_state).play(guess)
+        if None in position.kings:
+            return
+        self.ponder_position = position
+        self.ponder_result = None
+        self.pondering = True
+        self.stop_search = False
+        self.ponder_thread = threading.Thread(target=self.ponder, args=(position.to_state(), time.time()), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder(self, game_state, start_time):
+        self.ponder_result = self.use_minimax(game_state, alpha=-math.inf, beta=math.inf, maximizing_player=True,
+                                              start_time=start_time)
+
+    def finish_pondering(self, game_state):
+        """
+        Ends pondering once the human has moved. If game_state is the position
+        pondered on, the search goes on until TIME_LIMIT has passed since it
+        started (at once if the human took longer) and its (score, move) is
+        returned. Otherwise (or with game_state None) it is cancelled and None
+        is returned.
+        """
+        if self.ponder_thread is None:
+            return None
+        hit = game_state is not None and Position.from_state(game_state) == self.ponder_position
+        if hit:
+            self.pondering = False
+        else:
+            self.stop_search = True
+        self.ponder_thread.join()
+        result = self.ponder_result if hit else None
+        self.ponder_thread = None
+        self.ponder_position = None
+        self.ponder_result = None
+        self.pondering = False
+        self.stop_search = False
+        return result
+
+    def extract_pv(self, game_state, depth):
+        """
+        Follows the best moves stored in the transposition table from game_state
+        to rebuild the principal variation of the search just completed.
+        """
+        pv = []
+        key_extra = ZOBRIST_HEURISTICS.get(chosen_heuristic, 0)
+        while len(pv) < depth:
+            entry = self.transposition_table.probe(self.get_hash(game_state) ^ key_extra)
+            if entry is None or entry[3] is None or entry[3] not in self.valid_moves(game_state):
+                break
+            pv.append(entry[3])
+            self.apply_move(game_state, entry[3])
+        for _ in pv:
+            self.undo_move(game_state)
+        return pv
+
+    def minimax(self, game_state, depth, alpha, beta, maximizing_player, start_time, static_eval=None):
         """
         Core minimax (or alpha-beta) search:
           1) We terminate (return an evaluation score) if we reach depth 0, 
              the king no longer exists, or time is up.
           2) We generate all valid moves.
-          3) We check conditions:
+          3) We classify the moves in one pass and check conditions:
              - if our king is in danger, we first look for moves to save it.
              - if it is not in danger, see if we can capture the opponent's king.
              - otherwise, classify moves as safe or risky (where the king ends up in danger).
           4) We evaluate and sort these moves. Because of the transposition table,
-             repeated states aren't re-evaluated.
-          5) Use alpha-beta pruning if selected.
+             repeated states aren't re-evaluated, and the best move stored for the
+             position is searched first.
+          5) Use alpha-beta pruning if selected. Results are stored with a bound
+             flag, since a pruned search only proves the score is at least (or at
+             most) what it returned. Moves after the first are tried with a null
+             window first (principal variation search).
+        static_eval, if given, is evaluate(game_state), worked out in a batch by
+        the parent node (BATCH_EVAL).
         """
 
         global chosen_heuristic
@@ -687,28 +2336,45 @@ class MiniChess:
         self.states_explored_by_depth[depth] += 1
 
         # 1) Early-stop if we've reached the limit in depth, the king is gone, or we've hit our time limit
-        if depth == 0 or not self.king_exists(game_state, simulation=True) or (time.time() - start_time) >= TIME_LIMIT:
-            if chosen_heuristic == 'e1':
-                return self.evaluate_board_e1(game_state), None
-            elif chosen_heuristic == 'e2':
-                return self.evaluate_board_e2(game_state), None
-            elif chosen_heuristic == 'e3':
-                return self.evaluate_board_e3(game_state), None
-            elif chosen_heuristic == 'e4':
-                return self.evaluate_board_e4(game_state), None
-            else:
-                return self.evaluate_board_e0(game_state), None
+        if self.time_is_up(start_time):
+            self.search_aborted = True
+
+        # Endgame tables give the exact result below the root (the root itself needs a move,
+        # see probe_tablebase_root)
+        if self.tablebase is not None and depth < self.root_depth and not self.search_aborted:
+            bitboards = self.get_bitboards(game_state)
+            if bitboards['wK'] and bitboards['bK']:
+                value = self.tablebase.probe(bitboards, game_state["turn"])
+                if value is not None:
+                    return self.tablebase_score(value, game_state["turn"]), None
+
+        if depth == 0 or self.search_aborted or not self.king_exists(game_state, simulation=True):
+            # At the horizon, resolve pending captures before trusting the evaluation
+            if depth == 0 and not self.search_aborted and QUIESCENCE_DEPTH > 0 and self.king_exists(game_state, simulation=True):
+                return self.quiescence(game_state, alpha, beta, maximizing_player, start_time, QUIESCENCE_DEPTH,
+                                       static_eval), None
+            return (self.evaluate(game_state) if static_eval is None else static_eval), None
 
         # Determine the current king's color and the opponent's color
         king_color = 'w' if game_state['turn'] == "white" else 'b'
         opponent_color = 'b' if king_color == 'w' else 'w'
 
-        # Create a transposition key (essentially a snapshot of the board + whose turn + depth + if maximizing)
-        trans_key = (tuple(tuple(row) for row in game_state["board"]), game_state['turn'], depth, maximizing_player)
-
-        # If we've seen this exact scenario before, retrieve its stored result
-        if trans_key in self.transposition_table:
-            return self.transposition_table[trans_key]
+        # Transposition key: Zobrist hash of the board and side to move, for this heuristic
+        trans_key = self.get_hash(game_state) ^ ZOBRIST_HEURISTICS.get(chosen_heuristic, 0)
+        alpha_original, beta_original = alpha, beta
+
+        # If we've searched this position at least as deep before, its result may settle this node
+        hash_move = None
+        entry = self.transposition_table.probe(trans_key)
+        self.tt_probes += 1
+        if entry is not None:
+            self.tt_hits += 1
+            tt_score, tt_depth, tt_bound, hash_move = entry
+            if tt_depth >= depth and (tt_bound == TranspositionTable.EXACT
+                                      or (tt_bound == TranspositionTable.LOWER and tt_score >= beta)
+                                      or (tt_bound == TranspositionTable.UPPER and tt_score <= alpha)):
+                self.tt_cutoffs += 1
+                return tt_score, hash_move
 
         # Generate all possible valid moves for the current player
         all_moves = self.valid_moves(game_state)
@@ -717,64 +2383,72 @@ class MiniChess:
         self.total_branching_sum += len(all_moves)
         self.minimax_calls += 1
 
-        # 2) If the king is in danger, we want to filter moves that fix this problem
+        # 2) Play every move once and tag it: safe (our king can't be taken afterwards),
+        #    risky, or capturing the opponent's king without leaving ours en prise
         king_danger = self.is_king_in_danger(game_state, king_color)
-        danger_safe_moves = []
-        for move in all_moves:
-            # Simulate the move
-            temp_state = copy.deepcopy(game_state)
-            temp_state = self.make_move(temp_state, move, log_move=False, simulation=True)
-
-            # If the king is no longer in danger after this move, keep it as a 'safe' move
-            if not self.is_king_in_danger(temp_state, king_color):
-                danger_safe_moves.append(move)
-
-        # 3) If the king is not in danger, see if we can capture the opponent's king right away
-        king_capture_moves = []
-        if not king_danger:
-            for move in all_moves:
-                temp_state = copy.deepcopy(game_state)
-                temp_state = self.make_move(temp_state, move, log_move=False, simulation=True)
-
-                # If the opponent's king doesn't exist after our move, it's a king-capturing move
-                if not self.king_exists(temp_state, simulation=True) and not self.is_king_in_danger(temp_state, king_color):
-                    king_capture_moves.append(move)
-
-        # Choose which set of moves to evaluate based on the above logic
-        if king_danger and danger_safe_moves:
-            moves = danger_safe_moves  # Only moves that keep the king safe
-        elif king_capture_moves:
+        safe_moves, risky_moves, king_capture_moves = self.classify_moves(game_state, all_moves, king_color)
+
+        # 3) Choose which set of moves to evaluate based on the above logic, each set
+        #    ordered by order_moves (captures, killers, history)
+        ply = self.root_depth - depth
+        if king_danger and safe_moves:
+            moves = self.order_moves(game_state, safe_moves, ply)  # Only moves that save the king
+        elif king_capture_moves and not king_danger:
             moves = king_capture_moves  # Moves that let us capture the opponent's king
         else:
-            # If none of the above situations apply, we categorize moves as 'safe' or 'risky'
-            safe_moves = []
-            risky_moves = []
-            for move in all_moves:
-                temp_state = copy.deepcopy(game_state)
-                temp_state = self.make_move(temp_state, move, log_move=False, simulation=True)
-                # If we're still safe after this move, put it in safe_moves, else in risky
-                if not self.is_king_in_danger(temp_state, king_color):
-                    safe_moves.append(move)
-                else:
-                    risky_moves.append(move)
-
-            # If there are safe moves, we do them first, otherwise do the entire move list
-            moves = safe_moves + risky_moves if safe_moves else all_moves
+            # Otherwise search safe moves first, then the risky ones
+            moves = self.order_moves(game_state, safe_moves, ply) + self.order_moves(game_state, risky_moves, ply)
+
+        # The best move from an earlier search of this position goes first, and on the
+        # previous iteration's principal variation its move goes before even that
+        pv_move = None
+        if self.follow_pv and 0 <= ply < len(self.principal_variation):
+            pv_move = self.principal_variation[ply]
+        self.follow_pv = False
+        for first_move in (hash_move, pv_move):
+            if first_move in moves:
+                moves.remove(first_move)
+                moves.insert(0, first_move)
+
+        # On the last ply, the children's static evaluations can be computed together
+        leaf_evals = {}
+        if depth == 1 and BATCH_EVAL and BATCH_TABLES is not None and chosen_heuristic in BATCH_HEURISTICS and moves:
+            leaf_evals = dict(zip(moves, self.evaluate_batch(game_state, moves)))
 
         move_evaluations = []
 
         # Evaluate each move in the chosen set
         for move in moves:
             # If our time is about to run out, break early to avoid going over time
-            if (time.time() - start_time) >= TIME_LIMIT - 0.15:
+            if self.search_aborted or self.time_is_up(start_time, margin=TIME_MARGIN):
+                self.search_aborted = True
                 break
 
-            # Simulate the move
-            new_game_state = copy.deepcopy(game_state)
-            new_game_state = self.make_move(new_game_state, move, log_move=False, simulation=True)
-
-            # Recursively call minimax (with one less depth) and toggling maximizing_player
-            eval_score, _ = self.minimax(new_game_state, depth - 1, alpha, beta, not maximizing_player, start_time)
+            # Play the move in place, search it, then take it back. Only the PV move's
+            # subtree keeps following the principal variation.
+            is_capture = game_state["board"][move[1][0]][move[1][1]] != '.'
+            self.apply_move(game_state, move)
+            self.follow_pv = move == pv_move
+
+            # Recursively call minimax (with one less depth) and toggling maximizing_player. With
+            # alpha-beta, moves after the first are searched with a null window first (principal
+            # variation search), and again with the full window only if they turn out better.
+            static_eval = leaf_evals.get(move)
+            if algorithm == 'a' and move_evaluations and maximizing_player and alpha > -math.inf:
+                eval_score, _ = self.minimax(game_state, depth - 1, alpha, alpha + NULL_WINDOW, False, start_time, static_eval)
+            elif algorithm == 'a' and move_evaluations and not maximizing_player and beta < math.inf:
+                eval_score, _ = self.minimax(game_state, depth - 1, beta - NULL_WINDOW, beta, True, start_time, static_eval)
+            else:
+                eval_score = None
+            if eval_score is None or (alpha < eval_score < beta and not self.search_aborted):
+                if eval_score is not None:
+                    self.pvs_researches += 1
+                eval_score, _ = self.minimax(game_state, depth - 1, alpha, beta, not maximizing_player, start_time,
+                                             static_eval)
+            self.undo_move(game_state)
+            self.follow_pv = False
+            if self.search_aborted:
+                break
             move_evaluations.append((move, eval_score))
 
             # 4) Alpha-beta pruning logic if algorithm == 'a'
@@ -784,42 +2458,12 @@ class MiniChess:
                 else:
                     beta = min(beta, eval_score)
                 if beta <= alpha:  # If the window is closed, no need to explore further
+                    self.record_cutoff(game_state, move, is_capture, depth, ply, len(move_evaluations) == 1)
                     break
 
-        # 5) Sort the evaluated moves to pick the best according to the current player's color and role
-        if (player1_color == 'w'):
-            # If the player 1 color is white:
-            if game_state['turn'] == "white":
-                # This means white is playing, so we sort in descending order to get the highest eval first
-                move_evaluations.sort(key=lambda x: x[1], reverse=True)                
-                # print(f"TRUE Move evaluations at depth {depth} for {game_state['turn']} ({'max' if maximizing_player else 'min'}):")
-                # for mv, eval_score in move_evaluations:
-                #     print(f"Move: {mv} - Eval: {eval_score}")
-
-            else:
-                # If black is playing (and player1 is still white), we also sort in descending order 
-                # but the logic might lean differently based on your approach
-                move_evaluations.sort(key=lambda x: x[1], reverse=True)
-                # print(f"notFALSE Move evaluations at depth {depth} for {game_state['turn']} ({'max' if maximizing_player else 'min'}):")
-                # for mv, eval_score in move_evaluations:
-                #     print(f"Move: {mv} - Eval: {eval_score}")
-
-        else:
-            # If the player 1 color is black:
-            if game_state['turn'] == "black":
-                # Sort in ascending order for black if we consider black as the minimizing side
-                move_evaluations.sort(key=lambda x: x[1], reverse=False)
-                # print(f"FALSE2 Move evaluations at depth {depth} for {game_state['turn']} ({'max' if maximizing_player else 'min'}):")
-                # for mv, eval_score in move_evaluations:
-                #     print(f"Move: {mv} - Eval: {eval_score}")
-
-            else:
-                # Otherwise sort in descending for white
-                move_evaluations.sort(key=lambda x: x[1], reverse=True)
-                # print(f"TRUE2 Move evaluations at depth {depth} for {game_state['turn']} ({'max' if maximizing_player else 'min'}):")
-                # for mv, eval_score in move_evaluations:
-                #     print(f"Move: {mv} - Eval: {eval_score}")
-
+        # 5) Sort the evaluated moves so the best one for this node comes first:
+        #    highest score when maximizing, lowest when minimizing
+        move_evaluations.sort(key=lambda x: x[1], reverse=maximizing_player)
 
         # After sorting, the first element in move_evaluations is the best move for the current side
         if move_evaluations:
@@ -830,62 +2474,244 @@ class MiniChess:
             best_eval = -math.inf if maximizing_player else math.inf
             best_move = None
 
-        # Store the result in the transposition table to avoid recalculating
-        self.transposition_table[trans_key] = (best_eval, best_move)
+        # Store the result in the transposition table to avoid recalculating, unless the
+        # clock cut this search short (then some moves were never looked at)
+        if not self.search_aborted:
+            if best_eval <= alpha_original:
+                bound = TranspositionTable.UPPER
+            elif best_eval >= beta_original:
+                bound = TranspositionTable.LOWER
+            else:
+                bound = TranspositionTable.EXACT
+            self.transposition_table.store(trans_key, depth, bound, best_eval, best_move)
 
         return best_eval, best_move
 
-    def evaluate_board_e0(self, game_state):
-        e0 = {
-            'wp': 1, 'wB': 3, 'wN': 3, 'wQ': 9, 'wK': 999,
-            'bp': 1, 'bB': 3, 'bN': 3, 'bQ': 9, 'bK': 999
-        }
+    def evaluate(self, game_state):
+        """Static evaluation with chosen_heuristic, from self.ai_color's side."""
+        if chosen_heuristic == 'e1':
+            return self.evaluate_board_e1(game_state)
+        elif chosen_heuristic == 'e2':
+            return self.evaluate_board_e2(game_state)
+        elif chosen_heuristic == 'e3':
+            return self.evaluate_board_e3(game_state)
+        elif chosen_heuristic == 'e4':
+            return self.evaluate_board_e4(game_state)
+        else:
+            return self.evaluate_board_e0(game_state)
 
-        white_score = 0
-        black_score = 0
+    def evaluate_batch(self, game_state, moves):
+        """
+        evaluate() of the position after each of moves, for a heuristic in
+        BATCH_HEURISTICS, computed for all of them at once. The children are
+        rows of one int8 array made from this board, and every term is a
+        NumPy lookup or sum over that array: material by piece code, e1's
+        center and king-on-edge masks, e4's gathered piece-square values and
+        its threat bonus from the capture reach of each piece (sliders
+        blocked by anything between them and the target).
+        """
+        tables = BATCH_TABLES
+        parent = numpy.array([PIECE_CODES[piece] for row in game_state["board"] for piece in row], dtype=numpy.int8)
+        count = len(moves)
+        rows = numpy.arange(count)
+        starts = numpy.array([start[0] * 5 + start[1] for start, _ in moves])
+        ends = numpy.array([end[0] * 5 + end[1] for _, end in moves])
+        boards = numpy.repeat(parent[None, :], count, axis=0)
+        movers = boards[rows, starts]
+        movers = numpy.where(tables["last_rank"][movers, ends], tables["promotion"][movers], movers)
+        boards[rows, starts] = 0
+        boards[rows, ends] = movers
+
+        signs = tables["sign"][boards]
+        material = tables["material"][boards].sum(axis=1)
+        if chosen_heuristic == 'e1':
+            totals = (10 * material + 2 * (signs * tables["center"]).sum(axis=1)
+                      - 3 * (signs * tables["king"][boards] * tables["edge"]).sum(axis=1))
+            scores = [int(total) / 10 for total in totals]
+        elif chosen_heuristic == 'e4':
+            # attacks[n, from, to]: the piece on from could capture an enemy piece on to
+            blocked = (boards != 0).astype(numpy.float32) @ tables["between"] > 0
+            attacks = tables["reach"][boards, numpy.arange(25)] & ~blocked.reshape(count, 25, 25)
+            attacks &= signs[:, :, None] * signs[:, None, :] < 0
+            aggression = (attacks * signs[:, :, None] * tables["threat"][boards][:, None, :]).sum(axis=(1, 2))
+            psq = tables["psq"][boards, numpy.arange(25)].sum(axis=1)
+            # As in evaluate_board_e4, the material term is from ai_color's side before the total is
+            base = material if self.ai_color == "white" else -material
+            scores = [int(b) + int(a) + int(p) / 100 for b, a, p in zip(base, aggression, psq)]
+        else:
+            scores = [int(total) for total in material]
+        return scores if self.ai_color == "white" else [-score for score in scores]
 
-        for row in game_state["board"]:
-            for piece in row:
-                if piece in e0:
-                    if piece[0] == 'w':
-                        white_score += e0[piece]
-                    else:
-                        black_score += e0[piece]
+    def quiescence(self, game_state, alpha, beta, maximizing_player, start_time, depth, stand_pat=None):
+        """
+        Capture-only search below the horizon, so a leaf is never scored in the
+        middle of an exchange. The side to move may stand pat on the static
+        evaluation or try a capture, best victim first. Captures are skipped
+        when even winning the victim outright (plus DELTA_MARGIN) could not
+        reach the window (delta pruning) or when the static exchange on the
+        square loses material. depth counts down from QUIESCENCE_DEPTH.
+        A side whose king is attacked is not given a capture search: it is
+        scored as it stands, as before quiescence existed. stand_pat may be
+        passed in when the evaluation of game_state is already known.
+        """
+        self.cumulative_states_explored += 1
+        self.quiescence_nodes += 1
+
+        if stand_pat is None:
+            stand_pat = self.evaluate(game_state)
+        bitboards = self.get_bitboards(game_state)
+        if depth == 0 or not bitboards['wK'] or not bitboards['bK']:
+            return stand_pat
+        if self.time_is_up(start_time):
+            self.search_aborted = True
+            return stand_pat
+        king_color = 'w' if game_state["turn"] == "white" else 'b'
+        if self.is_king_in_danger(game_state, king_color):
+            return stand_pat
+
+        if maximizing_player:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
 
-        board_eval = white_score - black_score
+        board = game_state["board"]
+        captures = [move for move in self.valid_moves(game_state) if board[move[1][0]][move[1][1]] != '.']
+        best_eval = stand_pat
+        for move in self.order_moves(game_state, captures, -1):
+            (start_row, start_col), (end_row, end_col) = move
+            victim = board[end_row][end_col][1]
+            if victim != 'K':
+                victim_value = PIECE_VALUES[victim]
+                if maximizing_player and stand_pat + victim_value + DELTA_MARGIN <= alpha:
+                    continue
+                if not maximizing_player and stand_pat - victim_value - DELTA_MARGIN >= beta:
+                    continue
+                # Only a capture by a more valuable piece can lose the exchange
+                if PIECE_VALUES[board[start_row][start_col][1]] > victim_value and self.static_exchange(game_state, move) < 0:
+                    continue
+
+            self.apply_move(game_state, move)
+            eval_score = self.quiescence(game_state, alpha, beta, not maximizing_player, start_time, depth - 1)
+            self.undo_move(game_state)
+            if self.search_aborted:
+                break
+
+            if maximizing_player:
+                best_eval = max(best_eval, eval_score)
+                alpha = max(alpha, eval_score)
+            else:
+                best_eval = min(best_eval, eval_score)
+                beta = min(beta, eval_score)
+            if beta <= alpha:
+                break
+        return best_eval
+
+    def static_exchange(self, game_state, move):
+        """
+        Material the side to move gains by the capture move if both sides keep
+        recapturing on that square with their least valuable piece, and either
+        side may stop when continuing would lose more.
+        """
+        target = move[1]
+        board = game_state["board"]
+        gains = [PIECE_VALUES[board[target[0]][target[1]][1]]]
+        piece_value = PIECE_VALUES[board[move[0][0]][move[0][1]][1]]
+        self.apply_move(game_state, move)
+        played = 1
+
+        while True:
+            recaptures = [reply for reply in self.valid_moves(game_state) if reply[1] == target]
+            if not recaptures:
+                break
+            reply = min(recaptures, key=lambda reply: PIECE_VALUES[board[reply[0][0]][reply[0][1]][1]])
+            gains.append(piece_value - gains[-1])
+            piece_value = PIECE_VALUES[board[reply[0][0]][reply[0][1]][1]]
+            self.apply_move(game_state, reply)
+            played += 1
+
+        for _ in range(played):
+            self.undo_move(game_state)
+        # Each side only continues the exchange if that is better than stopping
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def order_moves(self, game_state, moves, ply):
+        """
+        Returns moves in the order alpha-beta should try them: captures first,
+        most valuable victim then least valuable attacker (MVV-LVA), then the
+        two killer moves of this ply, then quiet moves by their history score.
+        Ties keep generation order.
+        """
+        board = game_state["board"]
+        killers = self.killer_moves[ply] if 0 <= ply < len(self.killer_moves) else (None, None)
+        history = self.history_table[game_state["turn"] == "black"]
+
+        def move_key(move):
+            (start_row, start_col), (end_row, end_col) = move
+            victim = board[end_row][end_col]
+            if victim != '.':
+                return CAPTURE_ORDER + PIECE_VALUES[victim[1]] * 1000 - PIECE_VALUES[board[start_row][start_col][1]]
+            if move == killers[0]:
+                return KILLER_ORDER + 1
+            if move == killers[1]:
+                return KILLER_ORDER
+            return history[(start_row * 5 + start_col) * 25 + end_row * 5 + end_col]
+
+        return sorted(moves, key=move_key, reverse=True)
+
+    def record_cutoff(self, game_state, move, is_capture, depth, ply, first_move):
+        """
+        Bookkeeping for a beta cutoff: counts it (and whether the first move
+        searched caused it), and for a quiet move makes it this ply's first
+        killer and raises its history score by depth squared.
+        """
+        self.beta_cutoffs += 1
+        if first_move:
+            self.first_move_cutoffs += 1
+        if is_capture:
+            return
+
+        if 0 <= ply < len(self.killer_moves):
+            killers = self.killer_moves[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        (start_row, start_col), (end_row, end_col) = move
+        history = self.history_table[game_state["turn"] == "black"]
+        code = (start_row * 5 + start_col) * 25 + end_row * 5 + end_col
+        history[code] += depth * depth
+        if history[code] >= KILLER_ORDER:
+            # Keep history scores below the killers by halving them all
+            for side_history in self.history_table:
+                for index in range(len(side_history)):
+                    side_history[index] //= 2
+
+    def first_move_cutoff_rate(self):
+        """Share of beta cutoffs caused by the first move searched, as a percentage."""
+        return 100.0 * self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def evaluate_board_e0(self, game_state):
+        """
+        Material count (p=1, B=N=3, Q=9, K=999). The white-minus-black total is
+        kept up to date by make/unmake, so this is a lookup.
+        """
+        board_eval = self.get_bitboards(game_state)['material']
         return board_eval if self.ai_color == "white" else -board_eval
 
     def evaluate_board_e1(self, game_state):
         """
         Add a small bonus for pieces near the center and penalize isolated kings.
+        The per-square terms live in E1_TABLE (scaled by 10) and their sum is
+        kept up to date by make/unmake.
         """
-        center_positions = {(2,2), (2,3), (3,2), (3,3)}
-        score = 0
-        
-        # Basic piece values
-        piece_values = {
-            'p': 1, 'B': 3, 'N': 3, 'Q': 9, 'K': 999
-        }
-        
-        for r in range(5):
-            for c in range(5):
-                piece = game_state["board"][r][c]
-                if piece != '.':
-                    sign = 1 if piece[0] == 'w' else -1
-                    p_type = piece[1]
-                    
-                    # Add base piece value
-                    if p_type in piece_values:
-                        score += sign * piece_values[p_type]
-                    
-                    # Give extra points for controlling/occupying center squares
-                    if (r, c) in center_positions:
-                        score += 0.2 * sign
-
-                    # Slight penalty if the king is on the edge (to encourage safer middle positions)
-                    if p_type == 'K' and (r == 0 or r == 4 or c == 0 or c == 4):
-                        score -= 0.3 * sign
-        
+        score = self.get_bitboards(game_state)['e1'] / 10
+
         # Flip if AI is black
         return score if self.ai_color == "white" else -score
 
@@ -925,36 +2751,16 @@ class MiniChess:
         # Base material score
         base_score = self.evaluate_board_e0(game_state)
         
-        # Temporarily switch to opponent's turn to find which squares they threaten
-        original_turn = game_state["turn"]
-        opponent_turn = 'white' if original_turn == 'black' else 'black'
-        game_state["turn"] = opponent_turn
-        opponent_moves = self.valid_moves(game_state)
-        threatened_squares = {move[1] for move in opponent_moves}
-        
-        # Restore original turn
-        game_state["turn"] = original_turn
-        
-        # Find king positions
-        w_king_positions = []
-        b_king_positions = []
-        for r in range(5):
-            for c in range(5):
-                piece = game_state["board"][r][c]
-                if piece == 'wK':
-                    w_king_positions.append((r,c))
-                elif piece == 'bK':
-                    b_king_positions.append((r,c))
-
+        # Only the king of the side to move can stand on a square the opponent threatens,
+        # so ask whether that square is attacked rather than listing the opponent's moves
+        bitboards = self.get_bitboards(game_state)
         king_safety_score = 0
-        # Penalize threatened squares around your king, reward threatened squares near opponent's king
-        for (r,c) in w_king_positions:
-            if (r,c) in threatened_squares:
+        if game_state["turn"] == "white":
+            if bitboards['wK'] and self.is_king_in_danger(game_state, 'w'):
                 king_safety_score -= 5  # penalty if white king is threatened
-        for (r,c) in b_king_positions:
-            if (r,c) in threatened_squares:
-                king_safety_score += 5  # reward if black king is threatened when it's your move
-        
+        elif bitboards['bK'] and self.is_king_in_danger(game_state, 'b'):
+            king_safety_score += 5  # reward if black king is threatened when it's your move
+
         total_score = base_score + king_safety_score
         return total_score if self.ai_color == "white" else -total_score
 
@@ -965,83 +2771,6 @@ class MiniChess:
         - Reward advanced positions for pawns, center squares for knights/bishops, etc.
         - Slight bonus for threatening opponent's high-value pieces.
         """
-
-        piece_square_table = {
-            
-            # Black tables (row 0 is black’s back rank, row 4 is black’s front)
-            'bp': [
-                [2,  2,  2,  2,  2 ],
-                [2.25,  2.3,  2.3,  2.3,  2.3 ],
-                [3.1,  3.3,  3.3,  3.3,  3.1 ],
-                [3.15, 3.4,  3.4,  3.4,  3.15],
-                [4,  4,  4,  4,  4 ],
-            ],
-            'bN': [
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-                [1.3, 2.4, 2.4, 2.4, 1.3],
-                [1.3, 2.4, 3.5, 2.4, 1.3],
-                [1.3, 2.4, 2.4, 2.4, 1.3],
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-            ],
-            'bB': [
-                [1.3, 1.4, 1.4, 1.4, 1.3],
-                [1.3, 2.6, 2.6, 2.6, 1.3],
-                [1.4, 2.6, 2.75, 2.6, 1.4],
-                [1.3, 2.6, 2.6, 2.6, 1.3],
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-            ],
-            'bQ': [
-                [1.5, 1.5, 1.5, 1.5, 1.5],
-                [1.5, 2.6, 2.6, 2.6, 1.5],
-                [1.5, 2.6, 3.7, 2.6, 1.5],
-                [1.5, 2.6, 2.6, 2.6, 1.5],
-                [1.5, 1.5, 1.5, 1.5, 1.5],
-            ],
-            'bK': [
-                [0.2, 0.2, 0.2, 0.2, 0.2],
-                [0.2, 1.4, 1.4, 1.4, 0.2],
-                [0.2, 1.4, 0.2, 1.4, 0.2],
-                [0.2, 1.4, 1.4, 1.4, 0.2],
-                [0.2, 0.2, 0.2, 0.2, 0.2],
-            ],
-            # White tables (row 0 is top, row 4 is bottom)
-            'wp': [
-                [4,  4,  4,  4,  4 ],
-                [3.15, 3.4,  3.4,  3.4,  3.15],
-                [3.1,  3.3,  3.3,  3.3,  3.1 ],
-                [2.25,  2.3,  2.3,  2.3,  2.3 ],
-                [2,  2,  2,  2,  2 ],
-            ],
-            'wN': [
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-                [1.3, 2.4, 2.4, 2.4, 1.3],
-                [1.3, 2.4, 3.5, 2.4, 1.3],
-                [1.3, 2.4, 2.4, 2.4, 1.3],
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-            ],
-            'wB': [
-                [1.3, 1.4, 1.4, 1.4, 1.3],
-                [1.3, 2.6, 2.6, 2.6, 1.3],
-                [1.4, 2.6, 2.75, 2.6, 1.4],
-                [1.3, 2.6, 2.6, 2.6, 1.3],
-                [1.2, 1.3, 1.3, 1.3, 1.2],
-            ],
-            'wQ': [
-                [1.5, 1.5, 1.5, 1.5, 1.5],
-                [1.5, 2.6, 2.6, 2.6, 1.5],
-                [1.5, 2.6, 3.7, 2.6, 1.5],
-                [1.5, 2.6, 2.6, 2.6, 1.5],
-                [1.5, 1.5, 1.5, 1.5, 1.5],
-            ],
-            'wK': [
-                [0.2, 0.2, 0.2, 0.2, 0.2],
-                [0.2, 1.4, 1.4, 1.4, 0.2],
-                [0.2, 1.4, 0.2, 1.4, 0.2],
-                [0.2, 1.4, 1.4, 1.4, 0.2],
-                [0.2, 0.2, 0.2, 0.2, 0.2],
-            ],
-        }
-
         # Base material score
         base_score = self.evaluate_board_e0(game_state)
 
@@ -1072,27 +2801,130 @@ class MiniChess:
                 else:
                     aggression_score -= 1
 
-        # Piece-square bonuses
-        psq_bonus = 0
-        for r in range(5):
-            for c in range(5):
-                piece = game_state["board"][r][c]
-                if piece in piece_square_table:
-                    psq_bonus += piece_square_table[piece][r][c]
+        # Piece-square bonuses from PIECE_SQUARE_TABLE_E4, summed incrementally (scaled by 100)
+        psq_bonus = self.get_bitboards(game_state)['psq'] / 100
 
         total_score = base_score + aggression_score + psq_bonus
         return total_score if self.ai_color == "white" else -total_score
     
     # Helper to format large numbers into e.g. 1.2k, 2.2M, etc.
     def format_number(self, num):
-        if num >= 1_000_000:
-            return f"{num / 1_000_000:.1f}M"
-        elif num >= 1_000:
-            return f"{num / 1_000:.1f}k"
-        else:
-            return str(num)
+        return format_number(num)
+
+
+def search_worker(worker_id, memory_name, jobs, results):
+    """
+    Helper process for MiniChess.use_parallel_minimax. Searches each job it is
+    sent with its own MiniChess over the shared transposition table, starting
+    one ply deeper on odd worker ids, and reports its deepest completed result.
+    """
+    global chosen_heuristic, algorithm, TIME_LIMIT, MAX_SEARCH_DEPTH, QUIESCENCE_DEPTH, BATCH_EVAL, TIME_MARGIN
+    global USE_TABLEBASE, TABLEBASE_DIR, TT_SIZE_MB
+    memory = shared_memory.SharedMemory(name=memory_name)
+    # Its own table is replaced by the shared one straight away, so it need not be any size
+    TT_SIZE_MB = 0.01
+    engine = MiniChess()
+    engine.transposition_table = TranspositionTable(buffer=memory.buf)
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        chosen_heuristic, algorithm, TIME_LIMIT = job["heuristic"], job["algorithm"], job["time_limit"]
+        MAX_SEARCH_DEPTH, QUIESCENCE_DEPTH, BATCH_EVAL = job["max_depth"], job["quiescence_depth"], job["batch_eval"]
+        TIME_MARGIN = job["time_margin"]
+        if (USE_TABLEBASE, TABLEBASE_DIR) != (job["use_tablebase"], job["tablebase_dir"]):
+            USE_TABLEBASE, TABLEBASE_DIR = job["use_tablebase"], job["tablebase_dir"]
+            engine.tablebase_loaded = False  # open the tables again with the new settings
+        engine.ai_color = job["ai_color"]
+        engine.transposition_table.generation = job["generation"]
+        game_state = job["position"].to_state()
+        best_eval, best_move = engine.iterative_deepening(game_state, job["alpha"], job["beta"], job["maximizing_player"],
+                                                          job["start_time"], first_depth=1 + worker_id % 2)
+        results.put((job["job_id"], engine.completed_depth, best_eval, best_move))
+
+    engine.transposition_table.release()
+    memory.close()
+
+
+def seconds(text):
+    """--time-limit value: whole seconds stay an int, as the prompt reads them, so trace names and headers match."""
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def main(argv=None):
+    """
+    Without arguments, asks for the game options and plays one game as before.
+    With --headless, every option comes from the command line and the engine
+    plays --games games back to back in this process, printing each result.
+    """
+    global TT_SIZE_MB, SEARCH_WORKERS, TRACE_BACKGROUND, TRACE_FORMAT, OPENING_BOOK_FILE, USE_OPENING_BOOK
+    global TABLEBASE_DIR, USE_TABLEBASE, QUIESCENCE_DEPTH, BATCH_EVAL, SEARCH_STATS_FILE, PONDER, HASH_FILE
+    parser = argparse.ArgumentParser(description="MiniChess: 5x5 chess against a minimax / alpha-beta AI.")
+    parser.add_argument("--headless", action="store_true", help="take the options below instead of asking for them")
+    parser.add_argument("--mode", choices=['1', '2', '3'], default='3',
+                        help="1 = Player vs Player, 2 = Player vs AI, 3 = AI vs AI")
+    parser.add_argument("--player1-color", choices=['w', 'b'], default='w', help="color of player 1 (the second AI in mode 3)")
+    parser.add_argument("--algorithm", choices=['m', 'a'], default='a', help="m = minimax, a = alpha-beta")
+    parser.add_argument("--time-limit", type=seconds, default=3, help="seconds per AI move")
+    parser.add_argument("--max-turns", type=int, default=100, help="max number of turns (in total)")
+    parser.add_argument("--heuristic1", choices=HEURISTICS, default='e0', help="heuristic of the first AI (player 2)")
+    parser.add_argument("--heuristic2", choices=HEURISTICS, default='e0', help="heuristic of the second AI (player 1, mode 3)")
+    parser.add_argument("--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=SEARCH_WORKERS, help="search processes per AI move")
+    parser.add_argument("--quiescence-depth", type=int, default=QUIESCENCE_DEPTH,
+                        help="capture-only plies searched past the horizon (0 turns quiescence off)")
+    parser.add_argument("--batch-eval", action="store_true",
+                        help="score the last ply's children together with NumPy (e0, e1, e4; needs numpy)")
+    parser.add_argument("--hash-mb", type=float, default=TT_SIZE_MB, help="transposition table size in megabytes")
+    parser.add_argument("--hash-file", help="keep the transposition table across games: save it to this file after "
+                                            "each game and map it back at the start of the next run")
+    parser.add_argument("--trace-level", choices=TRACE_LEVELS, default=TRACE_LEVEL,
+                        help="gameTrace contents: off, summary (moves and result, no boards or AI stats) or full")
+    parser.add_argument("--trace-thread", action="store_true", help="write the gameTrace file from a background thread")
+    parser.add_argument("--trace-format", choices=['text', 'jsonl'], default=TRACE_FORMAT,
+                        help="text gameTrace-*.txt, or one JSON record per line with a move index")
+    parser.add_argument("--book", default=OPENING_BOOK_FILE, help="opening book file (built by MiniChessBook.py)")
+    parser.add_argument("--no-book", action="store_true", help="search every move, even when the opening book has it")
+    parser.add_argument("--tablebase", default=TABLEBASE_DIR, help="endgame table directory (built by MiniChessTablebase.py)")
+    parser.add_argument("--no-tablebase", action="store_true", help="search endgames instead of probing the tables")
+    parser.add_argument("--ponder", action="store_true",
+                        help="in Player vs AI mode, search the expected reply during the human's turn")
+    parser.add_argument("--stats", help="append the statistics of every AI search to this file, one JSON line each")
+    parser.add_argument("--verbose", action="store_true", help="print the board and every move")
+    args = parser.parse_args(argv)
+    if args.batch_eval and numpy is None:
+        parser.error("--batch-eval needs numpy")
+    PONDER, HASH_FILE = args.ponder, args.hash_file
+
+    if not args.headless:
+        game = MiniChess()
+        game.play()
+        return 0
+
+    TT_SIZE_MB, SEARCH_WORKERS, TRACE_BACKGROUND = args.hash_mb, args.workers, args.trace_thread
+    TRACE_FORMAT = args.trace_format
+    OPENING_BOOK_FILE, USE_OPENING_BOOK = args.book, not args.no_book
+    TABLEBASE_DIR, USE_TABLEBASE = args.tablebase, not args.no_tablebase
+    QUIESCENCE_DEPTH, BATCH_EVAL = args.quiescence_depth, args.batch_eval
+    SEARCH_STATS_FILE = args.stats
+    game = MiniChess()
+    game.verbose = args.verbose
+    game.configure(args.mode, args.player1_color, args.algorithm, args.time_limit, args.max_turns,
+                   args.heuristic1, args.heuristic2)
+
+    results = {}
+    for game_number in range(1, args.games + 1):
+        # One trace per game: numbered when there are several, so none overwrites another
+        result = game.run_game(args.trace_level, game_number if args.games > 1 else None)
+        results[result] = results.get(result, 0) + 1
+        print(f"Game {game_number}: {result}")
+    game.stop_search_workers()
+
+    print(", ".join(f"{result}: {count}" for result, count in sorted(results.items())))
+    return 0
 
 
 if __name__ == "__main__":
-    game = MiniChess()
-    game.play()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, Tablebase, PIECE_NAMES
+
+# Pieces that can join the two kings in a table, in PIECE_NAMES order
+EXTRA_PIECES = [name for name in PIECE_NAMES if name[1] != 'K']
+# With at most four pieces a king always has a move (a corner king needs three
+# pieces of its own to be walled in), so no table position is a position without
+# moves, which the game scores as a loss
+MAX_PIECES = 4
+
+
+def signatures(max_pieces):
+    """
+    Every material signature with both kings and at most max_pieces pieces, in
+    an order where the tables a signature depends on come first: fewer pieces,
+    then fewer pawns (a promotion turns a pawn into a queen).
+    """
+    result = []
+    for extra in range(max_pieces - 1):
+        for pieces in itertools.combinations_with_replacement(EXTRA_PIECES, extra):
+            signature = tuple(sorted(('wK', 'bK') + pieces, key=PIECE_NAMES.index))
+            result.append(signature)
+    return sorted(result, key=lambda signature: (len(signature), pawn_count(signature)))
+
+
+def pawn_count(signature):
+    return sum(1 for name in signature if name[1] == 'p')
+
+
+def placements(signature):
+    """
+    Yields (index, board) for every way to put the signature's pieces on the
+    board, with pieces of the same kind on ascending squares (as in
+    Tablebase.locate) and no pawn on the rank where it would have promoted.
+    The index is without the side to move.
+    """
+    squares = [None] * len(signature)
+
+    def place(position, index):
+        if position == len(signature):
+            board = [['.'] * 5 for _ in range(5)]
+            for name, sq in zip(signature, squares):
+                board[sq // 5][sq % 5] = name
+            yield index, board
+            return
+        name = signature[position]
+        first = squares[position - 1] + 1 if position > 0 and signature[position - 1] == name else 0
+        for sq in range(first, 25):
+            if sq in squares[:position]:
+                continue
+            if (name == 'wp' and sq < 5) or (name == 'bp' and sq >= 20):
+                continue
+            squares[position] = sq
+            yield from place(position + 1, index * 25 + sq)
+        squares[position] = None
+
+    yield from place(0, 0)
+
+
+def solve_signature(signature, directory):
+    """
+    Retrograde solution of one signature by value iteration. The tables of
+    every signature it can reach by a capture or a promotion must already be
+    in directory. Each position's moves are generated once: king captures
+    and moves into other tables are resolved straight away, the rest point
+    at positions of this table. Pass d then marks wins in d plies (a move to
+    a loss in d - 1) and losses in d plies (every move reaches a win, the
+    longest in d - 1), until a pass changes nothing and no outside result
+    is longer. Writes the table and returns (signature, positions, wins, losses, seconds).
+    """
+    start_time = time.time()
+    game = MiniChess()
+    tablebase = Tablebase(directory)
+    values = array('h', bytes(2 * 25 ** len(signature) * 2))
+    unresolved = []
+    longest_outside = 0
+    positions = 0
+
+    for placement_index, board in placements(signature):
+        for turn in ("white", "black"):
+            positions += 1
+            index = placement_index * 2 + (turn == "black")
+            game_state = {"board": [row[:] for row in board], "turn": turn}
+            bitboards = game.get_bitboards(game_state)
+
+            inside = []
+            outside_win = 0  # fastest win through a move out of this table
+            outside_loss = 0  # slowest loss through a move out of this table
+            outside_draw = False
+            for move in game.valid_moves(game_state):
+                (end_row, end_col) = move[1]
+                if game_state["board"][end_row][end_col][1:] == 'K':
+                    outside_win = 1
+                    break
+                game.apply_move(game_state, move)
+                child_signature, child_index = Tablebase.locate(bitboards, game_state["turn"])
+                game.undo_move(game_state)
+                if child_signature == signature:
+                    inside.append(child_index)
+                    continue
+                table = tablebase.table(child_signature)
+                if table is None:
+                    raise RuntimeError(f"{''.join(child_signature)} must be solved before {''.join(signature)}")
+                child_value = table[child_index]
+                if child_value < 0:
+                    outside_win = -child_value + 1 if not outside_win else min(outside_win, -child_value + 1)
+                elif child_value > 0:
+                    outside_loss = max(outside_loss, child_value + 1)
+                else:
+                    outside_draw = True
+
+            if outside_win == 1:
+                values[index] = 1
+                continue
+            longest_outside = max(longest_outside, outside_win, outside_loss)
+            unresolved.append((index, inside, outside_win, outside_loss, outside_draw))
+
+    distance = 2
+    while unresolved:
+        changed = False
+        still_unresolved = []
+        for position in unresolved:
+            index, inside, outside_win, outside_loss, outside_draw = position
+            if outside_win == distance or any(values[child] == 1 - distance for child in inside):
+                values[index] = distance
+                changed = True
+            elif (not outside_win and not outside_draw and all(values[child] > 0 for child in inside)
+                  and max([outside_loss] + [values[child] + 1 for child in inside]) == distance):
+                values[index] = -distance
+                changed = True
+            else:
+                still_unresolved.append(position)
+        unresolved = still_unresolved
+        if not changed and distance > longest_outside:
+            break
+        distance += 1
+
+    # Written under a temporary name first, so an interrupted run never leaves a partial table
+    file_name = Tablebase.file_name(directory, signature)
+    with open(file_name + ".part", "wb") as f:
+        values.tofile(f)
+    os.replace(file_name + ".part", file_name)
+
+    wins = sum(1 for value in values if value > 0)
+    losses = sum(1 for value in values if value < 0)
+    return signature, positions, wins, losses, time.time() - start_time
+
+
+def verify_signature(signature, directory):
+    """
+    Checks every entry of a solved table against the values of its children:
+    a king capture is a win in 1, else the fastest win is one more than the
+    quickest loss among the children, a draw is kept by any drawn child, and
+    a loss is one more than the longest win among them. Returns (signature,
+    positions, wrong, first wrong position or None, seconds).
+    """
+    start_time = time.time()
+    game = MiniChess()
+    tablebase = Tablebase(directory)
+    values = tablebase.table(signature)
+    positions = wrong = 0
+    example = None
+
+    for placement_index, board in placements(signature):
+        for turn in ("white", "black"):
+            positions += 1
+            index = placement_index * 2 + (turn == "black")
+            game_state = {"board": [row[:] for row in board], "turn": turn}
+            bitboards = game.get_bitboards(game_state)
+
+            children = []
+            for move in game.valid_moves(game_state):
+                (end_row, end_col) = move[1]
+                if game_state["board"][end_row][end_col][1:] == 'K':
+                    children = None
+                    break
+                game.apply_move(game_state, move)
+                child_signature, child_index = Tablebase.locate(bitboards, game_state["turn"])
+                game.undo_move(game_state)
+                children.append(tablebase.table(child_signature)[child_index])
+
+            if children is None:
+                expected = 1
+            elif any(value < 0 for value in children):
+                expected = min(-value for value in children if value < 0) + 1
+            elif 0 in children:
+                expected = 0
+            else:
+                expected = -(max(children) + 1)
+            if values[index] != expected:
+                wrong += 1
+                if example is None:
+                    example = (game.format_position(game_state), values[index], expected)
+    return signature, positions, wrong, example, time.time() - start_time
+
+
+def solve_job(job):
+    return solve_signature(*job)
+
+
+def verify_job(job):
+    return verify_signature(*job)
+
+
+def init_worker():
+    # The search tables are not used while solving
+    engine_module.TT_SIZE_MB = 0.01
+
+
+def generate(max_pieces, directory, workers, progress=True):
+    """
+    Solves every signature up to max_pieces pieces that has no table in
+    directory yet. Signatures with the same number of pieces and pawns do not
+    depend on each other and are solved in parallel.
+    """
+    os.makedirs(directory, exist_ok=True)
+    pending = [signature for signature in signatures(max_pieces)
+               if not os.path.exists(Tablebase.file_name(directory, signature))]
+    if progress:
+        print(f"{len(pending)} of {len(signatures(max_pieces))} tables to solve in {directory}")
+
+    with multiprocessing.Pool(processes=workers, initializer=init_worker) as pool:
+        for _, group in itertools.groupby(pending, key=lambda signature: (len(signature), pawn_count(signature))):
+            jobs = [(signature, directory) for signature in group]
+            for signature, positions, wins, losses, seconds in pool.imap_unordered(solve_job, jobs):
+                if progress:
+                    print(f"{''.join(signature):<16} {positions:>8} positions  {wins:>8} wins  "
+                          f"{losses:>8} losses  {seconds:6.1f} sec")
+
+
+def verify(directory, workers, progress=True):
+    """Runs verify_signature on every table in directory. Returns True when every entry agrees with its children."""
+    present = [signature for signature in signatures(MAX_PIECES)
+               if os.path.exists(Tablebase.file_name(directory, signature))]
+    wrong_tables = 0
+    with multiprocessing.Pool(processes=workers, initializer=init_worker) as pool:
+        jobs = [(signature, directory) for signature in present]
+        for signature, positions, wrong, example, seconds in pool.imap(verify_job, jobs):
+            wrong_tables += wrong > 0
+            if progress:
+                print(f"{''.join(signature):<16} {positions:>8} positions  {wrong:>8} wrong  {seconds:6.1f} sec")
+                if example is not None:
+                    position, stored, expected = example
+                    print(f"    {position}: stored {stored}, children give {expected}")
+    if progress:
+        print(f"{len(present)} tables checked, {wrong_tables} with wrong entries.")
+    return wrong_tables == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate MiniChess endgame tables by retrograde analysis.")
+    parser.add_argument("--pieces", type=int, default=3, choices=range(2, MAX_PIECES + 1),
+                        help="largest number of pieces (kings included) to solve")
+    parser.add_argument("--directory", default=engine_module.TABLEBASE_DIR, help="where the tables are written")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="tables solved at the same time")
+    parser.add_argument("--probe", help="print the table value of a position (see MiniChess.parse_position) instead")
+    parser.add_argument("--verify", action="store_true",
+                        help="check every entry of the tables in --directory against its children instead")
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        game = MiniChess()
+        game_state = game.parse_position(args.probe)
+        value = Tablebase(args.directory).probe(game.get_bitboards(game_state), game_state["turn"])
+        if value is None:
+            print("Not in the tables.")
+        elif value == 0:
+            print("Draw.")
+        else:
+            print(f"Side to move {'wins' if value > 0 else 'loses'} in {abs(value)} plies.")
+        return 0
+
+    if args.verify:
+        return 0 if verify(args.directory, args.workers) else 1
+
+    start_time = time.time()
+    generate(args.pieces, args.directory, args.workers)
+    print(f"Finished in {time.time() - start_time:.1f} sec.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, TranspositionTable, HEURISTICS
+
+# Each pool process keeps one MiniChess and one transposition table per side
+worker_game = None
+worker_tables = None
+
+
+class EngineConfig:
+    """One tournament entrant: a heuristic, an algorithm ('m' or 'a') and seconds per move."""
+
+    def __init__(self, heuristic, algorithm='a', time_limit=1.0):
+        self.heuristic = heuristic
+        self.algorithm = algorithm
+        self.time_limit = time_limit
+
+    @classmethod
+    def parse(cls, text, default_algorithm='a', default_time_limit=1.0):
+        """Reads 'e1', 'e1:m' or 'e1:a:0.5' (heuristic[:algorithm[:time limit]])."""
+        parts = text.split(':')
+        if parts[0] not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic {parts[0]!r} in engine {text!r}")
+        algorithm = parts[1] if len(parts) > 1 else default_algorithm
+        if algorithm not in ['m', 'a']:
+            raise ValueError(f"Unknown algorithm {algorithm!r} in engine {text!r}")
+        time_limit = float(parts[2]) if len(parts) > 2 else default_time_limit
+        return cls(parts[0], algorithm, time_limit)
+
+    @property
+    def name(self):
+        return f"{self.heuristic}:{self.algorithm}:{self.time_limit:g}"
+
+
+def schedule_games(engines, games_per_pair, gauntlet=False):
+    """
+    Returns (game id, white index, black index) for every game. Round robin pairs
+    every engine with every other one, gauntlet pairs the first engine with the
+    rest. Colors alternate within each pairing.
+    """
+    if gauntlet:
+        pairs = [(0, other) for other in range(1, len(engines))]
+    else:
+        pairs = [(a, b) for a in range(len(engines)) for b in range(a + 1, len(engines))]
+
+    games = []
+    for a, b in pairs:
+        for round_number in range(games_per_pair):
+            white, black = (a, b) if round_number % 2 == 0 else (b, a)
+            games.append((len(games), white, black))
+    return games
+
+
+def init_worker(hash_mb, use_book=False, use_tablebase=False):
+    global worker_game, worker_tables
+    engine_module.TT_SIZE_MB = hash_mb
+    # Off by default, so the heuristics being compared play the openings and endgames themselves
+    engine_module.USE_OPENING_BOOK = use_book
+    engine_module.USE_TABLEBASE = use_tablebase
+    worker_game = MiniChess()
+    worker_game.verbose = False
+    worker_tables = {"white": worker_game.transposition_table, "black": TranspositionTable(hash_mb)}
+
+
+def play_game(job):
+    """
+    Plays one game in a pool process. The side to move searches with its own
+    heuristic, algorithm, time limit and transposition table. The first
+    random_plies moves are random (seeded by the game id) so that repeated
+    pairings do not replay the same game. Returns the result with per-side
+    node counts, search time and number of searched moves.
+    """
+    game_id, white, black, max_turns, random_plies, seed = job
+    game = worker_game
+    game.new_game()
+    # Scores are kept from black's side, so white minimizes them (as in mode 3)
+    game.ai_color = "black"
+    configs = {"white": white, "black": black}
+    for table in worker_tables.values():
+        table.clear()
+    stats = {color: {"nodes": 0, "time": 0.0, "moves": 0} for color in configs}
+    rng = random.Random(seed * 1000003 + game_id)
+
+    plies = 0
+    while game.game_result is None:
+        if plies >= 2 * max_turns:
+            game.game_result = "MAX TURNS"
+            break
+        game_state = game.current_game_state
+        turn = game_state["turn"]
+        if plies < random_plies:
+            moves = game.valid_moves(game_state)
+            move = rng.choice(moves) if moves else None
+        else:
+            config = configs[turn]
+            engine_module.chosen_heuristic = config.heuristic
+            engine_module.algorithm = config.algorithm
+            engine_module.TIME_LIMIT = config.time_limit
+            game.transposition_table = worker_tables[turn]
+
+            nodes_before = game.cumulative_states_explored
+            start_time = time.time()
+            _, move = game.use_minimax(game_state, alpha=-math.inf, beta=math.inf,
+                                       maximizing_player=(turn == game.ai_color), start_time=start_time)
+            stats[turn]["time"] += time.time() - start_time
+            stats[turn]["nodes"] += game.cumulative_states_explored - nodes_before
+            stats[turn]["moves"] += 1
+
+        if move is None:
+            # A side with no moves loses, as in MiniChess.run_game
+            game.game_result = "BLACK WINS" if turn == "white" else "WHITE WINS"
+            break
+        game.current_game_state = game.make_move(game_state, move, simulation=False, log_move=False)
+        plies += 1
+
+    game.transposition_table = worker_tables["white"]
+    return game_id, game.game_result, stats
+
+
+class Standings:
+    """Win/draw/loss counts per pairing and per-engine search statistics."""
+
+    def __init__(self, engines):
+        self.engines = engines
+        count = len(engines)
+        # results[a][b] = [wins, draws, losses] of engine a against engine b
+        self.results = [[[0, 0, 0] for _ in range(count)] for _ in range(count)]
+        self.nodes = [0] * count
+        self.search_time = [0.0] * count
+        self.searched_moves = [0] * count
+
+    def add(self, white, black, result, stats):
+        if result == "WHITE WINS":
+            white_outcome = 0
+        elif result == "BLACK WINS":
+            white_outcome = 2
+        else:
+            white_outcome = 1  # draws and max turns
+        self.results[white][black][white_outcome] += 1
+        self.results[black][white][2 - white_outcome] += 1
+        for index, color in ((white, "white"), (black, "black")):
+            self.nodes[index] += stats[color]["nodes"]
+            self.search_time[index] += stats[color]["time"]
+            self.searched_moves[index] += stats[color]["moves"]
+
+    def totals(self, index):
+        wins = sum(row[0] for row in self.results[index])
+        draws = sum(row[1] for row in self.results[index])
+        losses = sum(row[2] for row in self.results[index])
+        return wins, draws, losses
+
+    def report(self):
+        names = [engine.name for engine in self.engines]
+        width = max(12, max(len(name) for name in names) + 2)
+
+        lines = ["Win/draw/loss (row engine against column engine):",
+                 " " * width + "".join(name.rjust(width) for name in names)]
+        for a, name in enumerate(names):
+            cells = []
+            for b in range(len(names)):
+                wins, draws, losses = self.results[a][b]
+                cells.append("-".rjust(width) if a == b or wins + draws + losses == 0
+                             else f"{wins}/{draws}/{losses}".rjust(width))
+            lines.append(name.ljust(width) + "".join(cells))
+
+        lines.append("")
+        lines.append(f"{'Engine'.ljust(width)}{'Games':>7}{'W':>6}{'D':>6}{'L':>6}{'Score':>8}"
+                     f"{'Elo':>8}{'+/-':>7}{'nps':>9}{'sec/move':>10}")
+        for index, name in enumerate(names):
+            wins, draws, losses = self.totals(index)
+            games = wins + draws + losses
+            score = (wins + draws / 2) / games if games else 0.0
+            elo, margin = elo_estimate(wins, draws, losses)
+            nps = self.nodes[index] / self.search_time[index] if self.search_time[index] > 0 else 0.0
+            per_move = self.search_time[index] / self.searched_moves[index] if self.searched_moves[index] else 0.0
+            lines.append(f"{name.ljust(width)}{games:>7}{wins:>6}{draws:>6}{losses:>6}{score * 100:>7.1f}%"
+                         f"{format_elo(elo):>8}{format_elo(margin):>7}"
+                         f"{nps:>9.0f}{per_move:>10.3f}")
+        return "\n".join(lines)
+
+
+def elo_difference(score):
+    """Elo difference that gives the expected score (0 < score < 1)."""
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def elo_estimate(wins, draws, losses):
+    """
+    Returns (Elo difference against the opponents faced, 95% error margin).
+    Perfect or zero scores give +/- infinity.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    if score <= 0.0 or score >= 1.0:
+        return (math.inf if score >= 1.0 else -math.inf), math.inf
+
+    # Standard deviation of the score of one game, then of the mean over all games
+    deviation = math.sqrt((wins * (1.0 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+    error = 1.96 * deviation / math.sqrt(games)
+    low, high = score - error, score + error
+    if low <= 0.0 or high >= 1.0:
+        return elo_difference(score), math.inf
+    return elo_difference(score), (elo_difference(high) - elo_difference(low)) / 2
+
+
+def format_elo(value):
+    if math.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return str(round(value))
+
+
+def run_tournament(engines, games_per_pair, max_turns, workers, hash_mb=4, gauntlet=False,
+                   random_plies=2, seed=0, use_book=False, use_tablebase=False, progress=True):
+    """Plays the whole schedule on a process pool and returns the Standings."""
+    schedule = schedule_games(engines, games_per_pair, gauntlet)
+    jobs = [(game_id, engines[white], engines[black], max_turns, random_plies, seed)
+            for game_id, white, black in schedule]
+    standings = Standings(engines)
+
+    with multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=(hash_mb, use_book, use_tablebase)) as pool:
+        for finished, (game_id, result, stats) in enumerate(pool.imap_unordered(play_game, jobs), start=1):
+            _, white, black = schedule[game_id]
+            standings.add(white, black, result, stats)
+            if progress:
+                print(f"[{finished}/{len(jobs)}] {engines[white].name} (white) vs "
+                      f"{engines[black].name} (black): {result}")
+    return standings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-robin or gauntlet tournament between MiniChess AI configurations.")
+    parser.add_argument("--engines", nargs="+", default=HEURISTICS,
+                        help="entrants as heuristic[:algorithm[:time limit]], e.g. e1 e4:m e2:a:0.5 (default: e0 to e4)")
+    parser.add_argument("--algorithm", choices=['m', 'a'], default='a', help="algorithm for entrants that do not give one")
+    parser.add_argument("--time-limit", type=float, default=1.0, help="seconds per move for entrants that do not give one")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing (colors alternate)")
+    parser.add_argument("--gauntlet", action="store_true", help="play the first engine against each of the others only")
+    parser.add_argument("--max-turns", type=int, default=50, help="turns per side before the game counts as a draw")
+    parser.add_argument("--random-plies", type=int, default=2, help="random opening moves so repeated games differ")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random opening moves")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="games played at the same time")
+    parser.add_argument("--hash-mb", type=float, default=4, help="transposition table size per side, in megabytes")
+    parser.add_argument("--book", action="store_true", help="let the engines play openings from the opening book")
+    parser.add_argument("--tablebase", action="store_true", help="let the engines play endgames from the endgame tables")
+    parser.add_argument("--quiet", action="store_true", help="only print the final tables")
+    args = parser.parse_args(argv)
+
+    try:
+        engines = [EngineConfig.parse(text, args.algorithm, args.time_limit) for text in args.engines]
+    except ValueError as error:
+        parser.error(str(error))
+    if len(engines) < 2:
+        parser.error("a tournament needs at least two engines")
+
+    start_time = time.time()
+    standings = run_tournament(engines, args.games, args.max_turns, args.workers, args.hash_mb,
+                               args.gauntlet, args.random_plies, args.seed, args.book, args.tablebase,
+                               progress=not args.quiet)
+    print()
+    print(standings.report())
+    print(f"\nFinished in {time.time() - start_time:.1f} sec with {args.workers} workers "
+          f"(opening book {'on' if args.book else 'off'}, endgame tables {'on' if args.tablebase else 'off'}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import argparse
+import json
+import mmap
+import sys
+from array import array
+
+from MiniChessSkeletonCode import JsonlTraceWriter, trace_index_name
+
+# Text trace lines that carry one field of the current record
+HEADER_FIELDS = {
+    " - Timeout (t): ": "timeout",
+    " - Max Turns (m): ": "max_turns",
+    " - Player 1 color: ": "player1_color",
+    " - Alpha-Beta: ": "alpha_beta",
+}
+MOVE_FIELDS = {
+    "Player: ": "player",
+    "Turn #": "turn",
+    "Captured piece: ": "capture",
+    "Time for this action: ": "time",
+    "Heuristic score of resulting board: ": "eval",
+    "Minimax/Alpha-Beta search score: ": "search_score",
+    " - Cumulative states explored: ": "states",
+    " - Cumulative states explored by depth: ": "states_by_depth",
+    " - Average branching factor: ": "branching",
+    " - First-move cutoff rate: ": "cutoff_rate",
+}
+
+
+def read_trace(file_name):
+    """Yields the records of a .jsonl trace one at a time, without loading the file."""
+    with open(file_name) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_moves(file_name, start=0):
+    """Yields the move records of a .jsonl trace, starting at move number start (0 is the first)."""
+    if start == 0:
+        for record in read_trace(file_name):
+            if record["type"] == "move":
+                yield record
+        return
+    with TraceIndex(file_name) as index:
+        if start >= len(index):
+            return
+        offset = index.offsets[start]
+    with open(file_name) as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "move":
+                yield record
+
+
+class TraceIndex:
+    """
+    Byte offsets of the move lines of a .jsonl trace, memory-mapped from its
+    .idx file, so any move can be read with one seek. Use build_index for
+    traces that have no index yet.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.index_file = open(trace_index_name(file_name), "rb")
+        size = self.index_file.seek(0, 2)
+        self.map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.offsets = memoryview(self.map).cast('Q') if self.map else []
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def move(self, number):
+        """Returns move record number (0 is the first move of the game)."""
+        with open(self.file_name) as f:
+            f.seek(self.offsets[number])
+            return json.loads(f.readline())
+
+    def close(self):
+        if self.map is not None:
+            self.offsets.release()
+            self.map.close()
+            self.map = None
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def build_index(file_name):
+    """Writes the .idx file of a .jsonl trace by scanning it once. Returns the number of moves."""
+    offsets = array('Q')
+    offset = 0
+    with open(file_name, "rb") as f:
+        for line in f:
+            if line.startswith(b'{"type":"move"'):
+                offsets.append(offset)
+            offset += len(line)
+    with open(trace_index_name(file_name), "wb") as f:
+        offsets.tofile(f)
+    return len(offsets)
+
+
+def parse_value(text):
+    """Reads a number the way the text trace printed it: 3, 0.25, -inf or 2.3k / 1.1M (rounded)."""
+    text = text.strip()
+    for suffix, scale in (("k", 1_000), ("M", 1_000_000)):
+        if text.endswith(suffix):
+            return int(round(float(text[:-1]) * scale))
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_text_trace(lines):
+    """
+    Yields ("game" | "move" | "result", record) for a text gameTrace, read line
+    by line. Records have the fields JsonlTraceWriter writes. Cumulative state
+    counts were printed rounded (e.g. 2.3k), so they come back rounded.
+    """
+    record_type, record, board = None, None, None
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if board is not None:
+            # Collecting the five rows of a board
+            if line.strip():
+                board.append(line.split())
+                if len(board) == 5:
+                    record["board"], board = board, None
+            continue
+
+        if line == "Game Parameters:":
+            record_type, record = "game", {"heuristics": []}
+        elif line == "====================================":
+            if record_type is not None:
+                yield record_type, record
+            record_type, record = "move", {"capture": None, "promotion": False, "time": None,
+                                           "eval": None, "search_score": None}
+        elif line == "=== GAME OVER ===":
+            if record_type is not None:
+                yield record_type, record
+            record_type, record = "result", {"result": None, "player": None, "turn": None}
+        elif line in ("Initial Board Configuration:", "New Board Configuration:"):
+            board = []
+        elif record_type == "game":
+            if line.startswith(" - Player 1 = "):
+                record["players"] = line[3:]
+            elif line.startswith(" - AI (one) Heuristic: ") or line.startswith(" - AI (two) Heuristic: "):
+                record["heuristics"].append(line.split(": ", 1)[1])
+            else:
+                for prefix, field in HEADER_FIELDS.items():
+                    if line.startswith(prefix):
+                        value = line[len(prefix):]
+                        if field == "alpha_beta":
+                            value = value == "True"
+                        elif field != "player1_color":
+                            value = parse_value(value)
+                        record[field] = value
+        elif record_type == "move":
+            if line.startswith("Action: Moved "):
+                # Action: Moved wp from B2 to B3
+                words = line.split()
+                record["piece"], record["from"], record["to"] = words[2], words[4], words[6]
+            elif line.startswith("Pawn Promotion: "):
+                record["promotion"] = True
+            else:
+                for prefix, field in MOVE_FIELDS.items():
+                    if line.startswith(prefix):
+                        value = line[len(prefix):]
+                        if field == "states_by_depth":
+                            value = {depth: parse_value(count) for depth, count in
+                                     (item.split("=") for item in value.split(", ") if item)}
+                        elif field == "time":
+                            value = float(value.split()[0])
+                        elif field == "cutoff_rate":
+                            value = float(value.rstrip("%"))
+                        elif field not in ("player", "capture"):
+                            value = parse_value(value)
+                        record[field] = value
+        elif record_type == "result":
+            if line.startswith("Final result: ") or line.startswith("Result: "):
+                record["result"] = line.split(": ", 1)[1]
+            elif line.startswith("Decision move: ("):
+                # Decision move: (D1 -> A4)
+                record["from"], record["to"] = line[len("Decision move: ("):-1].split(" -> ")
+            elif line.startswith("Occurred at turn #"):
+                record["turn"] = int(line[len("Occurred at turn #"):])
+            elif line.startswith("Draw occurred after "):
+                # Draw occurred after White's turn at turn #5
+                record["player"] = line[len("Draw occurred after "):].split("'")[0]
+                record["turn"] = int(line.rsplit("#", 1)[1])
+
+    if record_type is not None:
+        yield record_type, record
+
+
+def convert_text_trace(text_name, jsonl_name=None):
+    """Converts a text gameTrace into a .jsonl trace with its move index. Returns the new file name."""
+    if jsonl_name is None:
+        jsonl_name = (text_name[:-len(".txt")] if text_name.endswith(".txt") else text_name) + ".jsonl"
+    writer = JsonlTraceWriter(jsonl_name)
+    with open(text_name) as f:
+        for record_type, record in parse_text_trace(f):
+            if record_type == "game":
+                writer.write_header(record)
+            elif record_type == "move":
+                writer.write_move(record)
+            else:
+                writer.write_result(record)
+    writer.close()
+    return jsonl_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read, index and convert structured (.jsonl) MiniChess game traces.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert text gameTrace files to .jsonl with a move index")
+    convert.add_argument("files", nargs="+")
+
+    index = commands.add_parser("index", help="rebuild the move index of .jsonl traces")
+    index.add_argument("files", nargs="+")
+
+    moves = commands.add_parser("moves", help="print moves of a .jsonl trace")
+    moves.add_argument("file")
+    moves.add_argument("--start", type=int, default=0, help="first move to print (0 is the first move)")
+    moves.add_argument("--count", type=int, default=None, help="number of moves to print")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        for text_name in args.files:
+            print(f"{text_name} -> {convert_text_trace(text_name)}")
+    elif args.command == "index":
+        for file_name in args.files:
+            print(f"{file_name}: {build_index(file_name)} moves")
+    else:
+        for number, record in enumerate(read_moves(args.file, args.start), start=args.start):
+            if args.count is not None and number >= args.start + args.count:
+                break
+            capture = f" x{record['capture']}" if record["capture"] else ""
+            print(f"{number}: {record['player']} #{record['turn']} {record['piece']} "
+                  f"{record['from']}-{record['to']}{capture}  eval {record['eval']}  search {record['search_score']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import argparse
+import math
+import sys
+import threading
+import time
+
+import MiniChessSkeletonCode as engine_module
+from MiniChessSkeletonCode import MiniChess, HEURISTICS, TranspositionTable
+
+DEFAULT_MOVE_TIME = 3.0  # seconds for a "go" without limits, as in a headless game
+MOVES_TO_GO = 20  # moves a wtime / btime budget is split over when movestogo is not given
+CLOCK_RESERVE = 0.05  # seconds kept back from a wtime / btime budget for answering
+SEARCH_MARGIN = 0.005  # engine TIME_MARGIN: answering is one line, so the search may run up to the deadline
+DEFAULT_MAX_DEPTH = engine_module.MAX_SEARCH_DEPTH
+MAX_GO_DEPTH = 255  # deepest "go depth": the transposition table stores depths in 8 bits
+
+
+def format_uci_move(move):
+    """Writes a move in coordinate form, e.g. 'b2b3'."""
+    (start_row, start_col), (end_row, end_col) = move
+    return f"{chr(ord('a') + start_col)}{5 - start_row}{chr(ord('a') + end_col)}{5 - end_row}"
+
+
+def parse_uci_move(text):
+    """Reads a move written by format_uci_move (either case). Returns None if it is not one."""
+    text = text.lower()
+    if len(text) != 4 or any(c not in "abcde" for c in text[0::2]) or any(c not in "12345" for c in text[1::2]):
+        return None
+    return ((5 - int(text[1]), ord(text[0]) - ord('a')), (5 - int(text[3]), ord(text[2]) - ord('a')))
+
+
+class EngineProtocol:
+    """
+    A MiniChess engine driven by UCI-style commands, one per line. The process
+    and its MiniChess stay up between searches, so the transposition table,
+    history, opening book and endgame tables stay loaded from one move to the
+    next.
+
+      uci                                      id, options, uciok
+      isready                                  readyok (answered at once, even while searching)
+      setoption name NAME value VALUE          see OPTIONS
+      ucinewgame                               clears the search tables
+      position startpos [moves b2b3 ...]       the start position, then moves
+      position fen POSITION [moves ...]        POSITION in parse_position form
+      go [movetime MS] [depth N] [nodes N]     search the position and answer with bestmove
+         [wtime MS btime MS winc MS binc MS movestogo N] [infinite]
+      stop                                     end the search now (it still answers)
+      quit
+
+    Each go prints "info depth D score cp S nodes N nps N time MS pv ..." after
+    every completed iteration and "bestmove MOVE" at the end ("0000" when the
+    side to move has no move). The score is from the side to move's view, in
+    hundredths of the search score (a pawn is 100 with e0). A new position, go,
+    setoption or ucinewgame stops a search that is still running.
+
+    The scores in the transposition table are from the AI's side, so the AI
+    color stays white for the whole session and black's searches minimize,
+    as in an AI vs AI game. Entries then stay valid whichever side is searched.
+    """
+
+    OPTIONS = [
+        "option name Heuristic type combo default e0" + "".join(f" var {h}" for h in HEURISTICS),
+        "option name Algorithm type combo default a var a var m",
+        "option name Hash type spin default 16 min 1 max 4096",
+        "option name QuiescenceDepth type spin default 4 min 0 max 16",
+        "option name OwnBook type check default true",
+        "option name Tablebase type check default true",
+    ]
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.game = MiniChess()
+        self.game.verbose = False
+        self.game.ai_color = "white"
+        self.game_state = self.game.init_board()
+        self.search_thread = None
+        self.stopped = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        """Runs one command line. Returns False after quit."""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "quit":
+            self.stop()
+            return False
+        if command == "isready":
+            self.send("readyok")
+        elif command == "stop":
+            self.stop()
+        elif command == "uci":
+            self.send("id name MiniChess")
+            for option in self.OPTIONS:
+                self.send(option)
+            self.send("uciok")
+        elif command == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop()
+            self.game.new_game()
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        """setoption name NAME value VALUE; the module globals the game options use are set directly."""
+        if "value" not in args or args[:1] != ["name"]:
+            self.send("info string setoption needs: name NAME value VALUE")
+            return
+        split = args.index("value")
+        name, value = " ".join(args[1:split]).lower(), " ".join(args[split + 1:])
+        try:
+            if name == "heuristic" and value in HEURISTICS:
+                engine_module.chosen_heuristic = value
+            elif name == "algorithm" and value in ('a', 'm'):
+                engine_module.algorithm = value
+            elif name == "hash":
+                engine_module.TT_SIZE_MB = max(1, int(value))
+                self.game.transposition_table.release()
+                self.game.transposition_table = TranspositionTable(engine_module.TT_SIZE_MB)
+            elif name == "quiescencedepth":
+                engine_module.QUIESCENCE_DEPTH = max(0, int(value))
+            elif name == "ownbook" and value in ("true", "false"):
+                engine_module.USE_OPENING_BOOK = value == "true"
+            elif name == "tablebase" and value in ("true", "false"):
+                engine_module.USE_TABLEBASE = value == "true"
+            else:
+                self.send(f"info string cannot set {name} to {value!r}")
+        except ValueError:
+            self.send(f"info string cannot set {name} to {value!r}")
+
+    def set_position(self, args):
+        """position startpos | fen POSITION, then optionally moves M1 M2 ..."""
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args[:1] == ["startpos"]:
+                game_state = self.game.init_board()
+            elif args[:1] == ["fen"]:
+                game_state = self.game.parse_position(" ".join(args[1:moves_at]))
+            else:
+                self.send("info string position needs startpos or fen")
+                return
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        for text in args[moves_at + 1:]:
+            move = parse_uci_move(text)
+            if move is None or move not in self.game.valid_moves(game_state):
+                self.send(f"info string illegal move {text}")
+                break
+            self.game.apply_move(game_state, move)
+        self.game.undo_stack.clear()
+        self.game_state = game_state
+
+    def go(self, args):
+        """Starts the search of the current position in a thread, with the limits in args."""
+        limits = {}
+        for name, value in zip(args, args[1:] + [None]):
+            if name in ("movetime", "depth", "nodes", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[name] = int(value)
+                except (TypeError, ValueError):
+                    self.send(f"info string go {name} needs a number")
+                    return
+        infinite = "infinite" in args
+
+        # Seconds for this move: movetime, or a share of the side's clock, or none at all when the
+        # search is infinite or only has depth / node limits, else the default
+        white = self.game_state["turn"] == "white"
+        clock, increment = limits.get("wtime" if white else "btime"), limits.get("winc" if white else "binc", 0)
+        if "movetime" in limits:
+            time_limit = limits["movetime"] / 1000.0
+        elif clock is not None:
+            budget = clock / limits.get("movestogo", MOVES_TO_GO) + increment / 2
+            time_limit = max(0.0, min(budget, clock / 2) / 1000.0 - CLOCK_RESERVE)
+        elif infinite or "depth" in limits or "nodes" in limits:
+            time_limit = math.inf
+        else:
+            time_limit = DEFAULT_MOVE_TIME
+
+        self.stopped.clear()
+        game_state = {"board": [row[:] for row in self.game_state["board"]], "turn": self.game_state["turn"]}
+        self.search_thread = threading.Thread(target=self.search, daemon=True,
+                                              args=(game_state, time_limit, limits.get("depth"), limits.get("nodes"), infinite))
+        self.search_thread.start()
+
+    def search(self, game_state, time_limit, depth, nodes, infinite):
+        """Body of the search thread: searches game_state and sends the info lines and bestmove."""
+        game = self.game
+        white = game_state["turn"] == "white"
+        start_time = time.time()
+        start_nodes = game.cumulative_states_explored
+
+        def report(depth, score, pv):
+            searched = game.cumulative_states_explored - start_nodes
+            elapsed = time.time() - start_time
+            self.send(f"info depth {depth} score cp {round((score if white else -score) * 100)} nodes {searched} "
+                      f"nps {int(searched / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)} "
+                      f"pv {' '.join(format_uci_move(move) for move in pv)}")
+
+        move = None
+        bitboards = game.get_bitboards(game_state)
+        if bitboards['wK'] and bitboards['bK'] and game.valid_moves(game_state):
+            engine_module.TIME_LIMIT = time_limit
+            engine_module.MAX_SEARCH_DEPTH = max(1, min(depth, MAX_GO_DEPTH)) if depth else DEFAULT_MAX_DEPTH
+            game.node_limit = start_nodes + nodes if nodes else math.inf
+            game.on_iteration = report
+            game.stop_search = False
+            try:
+                score, move = game.use_minimax(game_state, -math.inf, math.inf, white, start_time)
+            finally:
+                game.on_iteration = None
+                game.node_limit = math.inf
+                engine_module.MAX_SEARCH_DEPTH = DEFAULT_MAX_DEPTH
+            if game.search_stats is None:
+                # Answered from the opening book or the endgame tables, without iterations
+                report(game.completed_depth, score, [move] if move is not None else [])
+            if move is None:
+                move = game.valid_moves(game_state)[0]
+
+        # An infinite search only answers once it is stopped
+        if infinite:
+            self.stopped.wait()
+        game.stop_search = False
+        self.send(f"bestmove {format_uci_move(move) if move is not None else '0000'}")
+
+    def stop(self):
+        """Ends the running search, if any, and waits for its bestmove."""
+        if self.search_thread is None:
+            return
+        self.game.stop_search = True
+        self.stopped.set()
+        self.search_thread.join()
+        self.search_thread = None
+        self.game.stop_search = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run MiniChess as a long-lived engine that reads UCI-style "
+                                                 "commands (uci, isready, setoption, position, go, stop, quit) "
+                                                 "from stdin and answers on stdout.")
+    parser.add_argument("--heuristic", choices=HEURISTICS, default='e0', help="heuristic until setoption changes it")
+    parser.add_argument("--algorithm", choices=['m', 'a'], default='a', help="m = minimax, a = alpha-beta")
+    parser.add_argument("--hash-mb", type=int, default=engine_module.TT_SIZE_MB, help="transposition table size in megabytes")
+    args = parser.parse_args(argv)
+
+    engine_module.chosen_heuristic, engine_module.algorithm = args.heuristic, args.algorithm
+    engine_module.TT_SIZE_MB = args.hash_mb
+    engine_module.TIME_MARGIN = SEARCH_MARGIN
+    protocol = EngineProtocol()
+    for line in sys.stdin:
+        if not protocol.handle(line):
+            break
+    protocol.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())